@@ -16,6 +16,16 @@ from src.core.middleware.middleware import init_token_refresh_middleware
 from src.core.services.cache.redis import ConnectionManager as redis_conmanager
 from src.core.services.chat.infrastructure.services.RoomService import RoomService
 from src.core.services.chat.infrastructure.services.ConnectionManager import ConnectionManager
+from src.core.services.chat.infrastructure.services.ChatBackplane import ChatBackplane
+from src.core.services.chat.infrastructure.services.ShardRouter import ShardRouter
+from src.core.services.chat.infrastructure.services.MessageService import MessageService
+from src.core.services.chat.infrastructure.services.PresenceService import PresenceService
+from src.core.services.chat.infrastructure.services.MessageWriter import MessageWriter
+from src.core.services.chat.infrastructure.services.DBService import DBService
+from src.core.services.cache.history_cache import HistoryCache
+from src.core.services.cache.unread_counters import UnreadCounters
+from src.core.services.cache.user_cache import user_cache
+from src.core.services.database.chat_archive import ChatArchive
 
 
 from src.api.v1.endpoints.healthcheck import router as heath_router
@@ -23,6 +33,7 @@ from src.api.v1.endpoints.main_router import router as main_router
 from src.api.v1.auth.authentication import router as auth_router
 from src.api.v1.endpoints.chat import router as chat_router
 from src.api.v1.endpoints.direct_messages import router as direct_msg_router
+from src.api.v1.endpoints.search import router as search_router
 from src.api.v1.auth.profile_managment import router as profile_router
 from src.api.v1.auth.webauthn import router as foreign_api_router 
 from src.api.v1.auth.MFA import router as MFA_router
@@ -36,21 +47,67 @@ async def lifespan(app: FastAPI):
     app.mount("/media", StaticFiles(directory=media_root), name="media")
     app.mount("/static", StaticFiles(directory=static_root), name="static")
 
-    app.state.room_service = RoomService()
-    app.state.con_manager = ConnectionManager()
-
     redis_manager = redis_conmanager()
     app.state.redis_manager = redis_manager
 
-    try:
-        await redis_manager.redis.flushdb()
-        logger.info("🧹 Redis database flushed successfully")
-    except Exception as e:
-        logger.error(f"❌ Failed to flush Redis database: {e}")
+    backplane = ChatBackplane(redis_manager) if settings.chat.backplane else None
+    shard_router = None
+    if settings.chat.shards:
+        if backplane:
+            shard_router = ShardRouter(redis_manager, worker_id=backplane.worker_id)
+        else:
+            logger.warning("Chat shards need the backplane to reach sockets on other workers, shard mode is off")
+
+    await user_cache.start()
+    app.state.user_cache = user_cache
+
+    app.state.history_cache = HistoryCache(redis_manager)
+    app.state.chat_archive = ChatArchive()
+    app.state.unread = UnreadCounters(redis_manager)
+    app.state.message_writer = MessageWriter(
+        on_saved=app.state.history_cache.append_saved
+    ) if settings.chat.write_behind else None
+    if app.state.message_writer:
+        await app.state.message_writer.start()
+
+    app.state.room_service = RoomService()
+    app.state.con_manager = ConnectionManager(backplane=backplane, shard_router=shard_router)
+    await app.state.con_manager.start(app.state.room_service)
+
+    if shard_router:
+        message_service = MessageService(connection_manager=app.state.con_manager)
+        async def on_forwarded(payload: dict):
+            await message_service.process_forwarded(
+                payload,
+                app.state.room_service,
+                DBService(
+                    writer=app.state.message_writer,
+                    history_cache=app.state.history_cache,
+                    archive=app.state.chat_archive,
+                    unread=app.state.unread
+                )
+            )
+        await shard_router.start(on_forwarded)
+
+    app.state.presence = PresenceService(
+        app.state.con_manager,
+        app.state.room_service,
+        redis_manager,
+        worker_id=backplane.worker_id if backplane else None
+    )
+    await app.state.presence.start()
     
     yield  # FastAPI handles requests here
 
     try:
+        await app.state.presence.stop()
+        await user_cache.stop()
+        await app.state.con_manager.stop()
+        if shard_router:
+            await shard_router.stop()
+        # Queued messages go to the database before the pool is disposed
+        if app.state.message_writer:
+            await app.state.message_writer.stop()
         await redis_manager.pubsub.close()
         await redis_manager.redis.close()
         await db_helper.dispose()
@@ -81,6 +138,7 @@ app.include_router(auth_router)
 app.include_router(profile_router)
 app.include_router(chat_router)
 app.include_router(direct_msg_router)
+app.include_router(search_router)
 app.include_router(foreign_api_router)
 app.include_router(MFA_router)
 
@@ -0,0 +1,114 @@
+"""
+Benchmark for password hashing under a login burst: measures how late the event loop
+wakes up while a burst of bcrypt verifications runs, with bcrypt called inline on the
+loop as before and through the bounded hash pool.
+
+No database or redis needed.
+
+python scripts/bench_login_burst.py
+python scripts/bench_login_burst.py --logins 50 --workers 4 --queue 8
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from passlib.context import CryptContext
+
+import src.core.services.auth.domain.interfaces  # noqa: F401 enters the auth import cycle where it resolves
+from src.core.services.auth.infrastructure.services.Bcryptprovider import HashPool
+from src.core.exceptions.auth_exception import AuthException
+
+
+TICK = 0.01
+
+
+async def ticker(lags: list, stop: asyncio.Event):
+    """Stands in for the sockets of the worker: wants the loop every TICK seconds"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append((time.perf_counter() - started - TICK) * 1000)
+
+
+async def burst(verify, logins: int) -> tuple:
+    lags, stop = [], asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(TICK * 5)
+
+    async def login():
+        started = time.perf_counter()
+        try:
+            await verify()
+            return time.perf_counter() - started, True
+        except AuthException:
+            return time.perf_counter() - started, False
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick
+
+    accepted = sorted(t for t, ok in results if ok)
+    refused = sorted(t for t, ok in results if not ok)
+    lags.sort()
+    return {
+        'elapsed': elapsed,
+        'lag_p50': statistics.median(lags),
+        'lag_p99': lags[int(len(lags) * 0.99) - 1] if len(lags) > 1 else lags[-1],
+        'lag_max': lags[-1],
+        'accepted': len(accepted),
+        'refused': len(refused),
+        'login_p50': statistics.median(accepted) * 1000 if accepted else 0,
+        'refused_p50': statistics.median(refused) * 1000 if refused else 0
+    }
+
+
+def report(name: str, result: dict):
+    print(
+        f"{name:<10}{result['elapsed']:>9.2f}s"
+        f"{result['lag_p50']:>10.1f}{result['lag_p99']:>10.1f}{result['lag_max']:>10.1f}"
+        f"{result['accepted']:>6}{result['refused']:>6}"
+        f"{result['login_p50']:>11.0f}{result['refused_p50']:>11.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=16, help='concurrent logins in the burst')
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt cost')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--queue', type=int, default=8)
+    args = parser.parse_args()
+    # Every refused login logs a warning
+    logging.disable(logging.WARNING)
+
+    context = CryptContext(schemes=["bcrypt"], bcrypt__ident="2b", bcrypt__rounds=args.rounds)
+    hashed = context.hash('password')
+
+    async def inline():
+        # What verify_password did before: a coroutine that never yields
+        return context.verify('password', hashed)
+
+    async def run():
+        pool = HashPool(workers=args.workers, queue_size=args.queue)
+
+        async def pooled():
+            return await pool.run(context.verify, 'password', hashed)
+
+        print(f"{args.logins} logins, bcrypt cost {args.rounds}, pool {args.workers} workers + {args.queue} queued\n")
+        print(f"{'':<10}{'burst':>10}{'lag p50':>10}{'lag p99':>10}{'lag max':>10}{'ok':>6}{'429':>6}{'login ms':>11}{'429 ms':>11}")
+        report('inline', await burst(inline, args.logins))
+        report('pool', await burst(pooled, args.logins))
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
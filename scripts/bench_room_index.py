@@ -0,0 +1,68 @@
+"""
+Micro-benchmark: disconnect cleanup with the user->rooms reverse index
+versus the old walk over every room.
+
+python scripts/bench_room_index.py
+"""
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.core.services.chat.infrastructure.services.RoomService import RoomService
+
+
+ROOMS = 10_000
+USERS = 50_000
+ROOMS_PER_USER = 3
+DISCONNECTS = 1_000
+ROOM_TYPES = ('general', 'private', 'games', 'work')
+
+
+def full_scan_cleanup(room_serv: RoomService, user_id: str):
+    """Cleanup as ConnectionManager.disconnect did before the index"""
+    for room_type in room_serv.rooms:
+        for room_id in room_serv.rooms[room_type]:
+            room_serv.rooms[room_type][room_id]['clients'].discard(user_id)
+
+
+async def populate() -> RoomService:
+    room_serv = RoomService()
+    rooms = [(ROOM_TYPES[i % len(ROOM_TYPES)], f'room-{i}') for i in range(ROOMS)]
+    for room_type, room_id in rooms:
+        await room_serv.create_room(room_type, room_id)
+
+    rnd = random.Random(42)
+    for user in range(USERS):
+        for room_type, room_id in rnd.sample(rooms, ROOMS_PER_USER):
+            await room_serv.join_room(str(user), room_type, room_id)
+    return room_serv
+
+
+async def main():
+    rnd = random.Random(7)
+    victims = [str(i) for i in rnd.sample(range(USERS), DISCONNECTS)]
+
+    room_serv = await populate()
+    start = time.perf_counter()
+    for user_id in victims:
+        full_scan_cleanup(room_serv, user_id)
+    scan = time.perf_counter() - start
+
+    room_serv = await populate()
+    start = time.perf_counter()
+    for user_id in victims:
+        await room_serv.leave_all_rooms(user_id)
+    indexed = time.perf_counter() - start
+
+    print(f"{ROOMS} rooms, {USERS} users, {ROOMS_PER_USER} rooms per user, {DISCONNECTS} disconnects")
+    print(f"full scan: {scan * 1000:.1f} ms total, {scan / DISCONNECTS * 10**6:.1f} us per disconnect")
+    print(f"reverse index: {indexed * 1000:.1f} ms total, {indexed / DISCONNECTS * 10**6:.1f} us per disconnect")
+    print(f"speedup: x{scan / indexed:.0f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
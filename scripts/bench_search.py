@@ -0,0 +1,156 @@
+"""
+Benchmark for message search: generates chat history server side and times the
+ranked tsvector search against a naive ILIKE scan.
+
+Needs the database from .env migrated to head.
+
+python scripts/bench_search.py --generate --rows 20000000
+python scripts/bench_search.py
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import string
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import text
+
+import src.core.services.auth.domain.models.refresh_token  # noqa: F401 mapper registry needs every model
+from src.core.dependencies.db_injection import db_helper
+from src.core.services.database.orm.chat_orm import search_messages
+from src.core.services.database.orm.partition_orm import create_partitions, month_start
+
+
+VOCABULARY = 20_000
+BATCH = 200_000
+ROOM_TYPES = ('general', 'games', 'work', 'private')
+RUNS = 20
+
+# Rows are 6-15 words, power(random(), 3) skews the picks so low indexes are common words
+GENERATE = text("""
+    INSERT INTO messages (room_type, room_id, user_id, message, created_at, is_read)
+    SELECT
+        (CAST(:room_types AS text[]))[1 + g % 4],
+        'room-' || (g % :rooms),
+        1 + g % 10000,
+        (
+            SELECT string_agg(words[1 + floor(power(random(), 3) * cardinality(words))::int], ' ')
+            FROM generate_series(1, 6 + g % 10), (SELECT CAST(:words AS text[]) AS words) v
+            WHERE g > 0
+        ),
+        timezone('UTC', now()) - random() * make_interval(months => :months),
+        false
+    FROM generate_series(CAST(:start AS bigint), CAST(:stop AS bigint)) g
+""")
+
+NAIVE = text("""
+    SELECT id FROM messages
+    WHERE message ILIKE :pattern AND room_type IS DISTINCT FROM 'private'
+    ORDER BY id DESC LIMIT 20
+""")
+
+
+def vocabulary() -> list:
+    rnd = random.Random(42)
+    return [''.join(rnd.choices(string.ascii_lowercase, k=rnd.randint(3, 9))) for _ in range(VOCABULARY)]
+
+
+async def generate(rows: int, months: int, rooms: int):
+    words = vocabulary()
+    today = datetime.now(timezone.utc).date()
+    async with db_helper.async_session() as session:
+        # Rows are spread over the past months, their partitions have to exist
+        await create_partitions(session, 'messages', month_start(today, -months), months)
+        await create_partitions(session, 'directs', month_start(today, -months), months)
+
+        started = time.perf_counter()
+        for start in range(1, rows + 1, BATCH):
+            stop = min(start + BATCH - 1, rows)
+            await session.execute(GENERATE, {
+                'room_types': list(ROOM_TYPES),
+                'rooms': rooms,
+                'words': words,
+                'months': months,
+                'start': start,
+                'stop': stop
+            })
+            await session.commit()
+            print(f"{stop:>12,} rows  {time.perf_counter() - started:8.1f}s", flush=True)
+
+    async with db_helper.engine.connect() as conn:
+        await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await conn.execute(text("VACUUM ANALYZE messages"))
+
+
+async def timed(call, runs: int = RUNS) -> tuple:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await call()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+async def bench():
+    words = vocabulary()
+    cases = [
+        ('common word', words[0], {}),
+        ('rare word', words[-1], {}),
+        ('two words', f'{words[1]} {words[50]}', {}),
+        ('phrase', f'"{words[2]} {words[3]}"', {}),
+        ('common word, one room', words[0], {'room_type': 'general', 'room_id': 'room-4'}),
+        ('rare word, one room', words[-1], {'room_type': 'general', 'room_id': 'room-4'}),
+    ]
+
+    async with db_helper.async_session() as session:
+        # The parent of a partitioned table has no statistics of its own
+        count = (await session.execute(text(
+            "SELECT coalesce(sum(c.reltuples), 0)::bigint FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'messages'::regclass"
+        ))).scalar()
+        print(f"~{count:,} messages\n")
+        print(f"{'query':<26}{'median ms':>12}{'p95 ms':>10}")
+
+        for name, query, scope in cases:
+            async def search():
+                await search_messages(session, query, 20, **scope)
+                # Every run on its own snapshot, as requests would
+                await session.commit()
+            median, p95 = await timed(search)
+            print(f"{name:<26}{median:>12.2f}{p95:>10.2f}")
+
+            if not scope and name == 'rare word':
+                async def naive():
+                    await session.execute(NAIVE, {'pattern': f'%{query}%'})
+                    await session.commit()
+                median, p95 = await timed(naive, runs=3)
+                print(f"{'  ILIKE, same word':<26}{median:>12.2f}{p95:>10.2f}")
+
+    await db_helper.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--generate', action='store_true', help='insert benchmark rows first')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--months', type=int, default=12, help='rows are spread over this many past months')
+    parser.add_argument('--rooms', type=int, default=500)
+    args = parser.parse_args()
+
+    async def run():
+        if args.generate:
+            await generate(args.rows, args.months, args.rooms)
+        await bench()
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark for refresh-token rotation: rotations per second of the previous three
+transaction path (select, insert + commit + refresh, update + commit + refresh)
+against the single INSERT ... SELECT FROM (UPDATE ... RETURNING) statement.
+
+Every worker rotates its own token chain on its own session, as concurrent users would.
+A bench user is created for the run and deleted afterwards with its tokens.
+
+Needs the database from .env migrated to head.
+
+python scripts/bench_token_rotation.py
+python scripts/bench_token_rotation.py --rotations 5000 --concurrency 16
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import src.core.services.auth.domain.models.refresh_token  # noqa: F401 mapper registry needs every model
+import src.core.services.auth.domain.interfaces  # noqa: F401 enters the auth import cycle where it resolves
+from src.core.dependencies.db_injection import db_helper
+from src.core.schemas.auth_schema import RefreshToken
+from src.core.services.auth.domain.models.user import UserModel
+from src.core.services.database.orm.token_crud import (
+    delete_data_by_user,
+    new_token_insert,
+    rotate_token,
+    select_data_token,
+    update_data_token
+)
+from src.core.services.database.orm.user_orm import delete_data_user
+
+
+def scheme(user_id: int, family_id: str) -> RefreshToken:
+    return RefreshToken(
+        user_id=user_id,
+        token=uuid.uuid4().hex,
+        expires_at=datetime.now(timezone.utc) + timedelta(days=7),
+        family_id=family_id
+    )
+
+
+async def rotate_previous(session, old: str, user_id: int) -> str:
+    old_token = await select_data_token(session, old)
+    new = scheme(old_token.user_id, old_token.family_id)
+    new.previous_token_id = old_token.id
+    new.device_info = old_token.device_info
+    await new_token_insert(session, new)
+    await update_data_token(session, new, old_token)
+    return new.token
+
+
+async def rotate_single(session, old: str, user_id: int) -> str:
+    new = scheme(user_id, str(uuid.uuid4()))
+    await rotate_token(session, old, new)
+    return new.token
+
+
+async def chain(rotate, user_id: int, rotations: int, latencies: list):
+    async with db_helper.async_session() as session:
+        first = scheme(user_id, str(uuid.uuid4()))
+        await new_token_insert(session, first)
+        token = first.token
+        for _ in range(rotations):
+            started = time.perf_counter()
+            token = await rotate(session, token, user_id)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def run_case(rotate, user_id: int, rotations: int, concurrency: int) -> tuple:
+    latencies = []
+    per_chain = max(1, rotations // concurrency)
+    started = time.perf_counter()
+    await asyncio.gather(*(chain(rotate, user_id, per_chain, latencies) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return len(latencies) / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+async def bench(rotations: int, concurrency: int):
+    async with db_helper.async_session() as session:
+        name = f"bench-{uuid.uuid4().hex[:8]}"
+        user = UserModel(login=name, password='-', email=f"{name}@bench.local")
+        session.add(user)
+        await session.commit()
+        user_id = user.id
+
+    try:
+        print(f"{rotations} rotations, {concurrency} concurrent chains\n")
+        print(f"{'path':<24}{'rotations/s':>14}{'median ms':>12}{'p99 ms':>10}")
+        for name, rotate in (('select/insert/update', rotate_previous), ('single statement', rotate_single)):
+            per_second, median, p99 = await run_case(rotate, user_id, rotations, concurrency)
+            print(f"{name:<24}{per_second:>14.0f}{median:>12.2f}{p99:>10.2f}")
+    finally:
+        async with db_helper.async_session() as session:
+            await delete_data_by_user(session, user_id)
+            await delete_data_user(session, user_id)
+        await db_helper.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rotations', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(bench(args.rotations, args.concurrency))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Micro-benchmark: json text frames versus the chat.msgpack binary protocol.
+Encodes the live and historical envelopes as the server sends them and decodes
+an inbound client message as the endpoints read it.
+
+python scripts/bench_wire_protocol.py
+"""
+import json
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import msgpack
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.core.services.chat.infrastructure.services.BroadcastFrame import (
+    BroadcastFrame,
+    TEXT,
+    MSGPACK,
+    decode_inbound
+)
+
+
+ROUNDS = 100_000
+
+
+def envelopes():
+    live = {
+        "id": str(uuid.uuid4()),
+        "type": "message",
+        "sender_id": "42",
+        "sender": "new-00",
+        "content": "hey everyone, the build is green again",
+        "timestamp": datetime.now().isoformat()
+    }
+    historical = {
+        "id": "1024",
+        "type": "historical",
+        "sender_id": "42",
+        "content": "new-00: hey everyone, the build is green again",
+        "timestamp": datetime.now().isoformat()
+    }
+    inbound = {"content": "hey everyone, the build is green again", "sender": "new-00"}
+    return live, historical, inbound
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    return (time.perf_counter() - start) / ROUNDS * 10**9
+
+
+def main():
+    live, historical, inbound = envelopes()
+    inbound_text = {'type': 'websocket.receive', 'text': json.dumps(inbound)}
+    inbound_bytes = {'type': 'websocket.receive', 'bytes': msgpack.packb(inbound, use_bin_type=True)}
+
+    print(f"{ROUNDS} rounds, ns per operation, bytes per frame")
+    print(f"{'':<22}{'json':>10}{'msgpack':>10}")
+    for name, payload in (('live encode', live), ('historical encode', historical)):
+        json_ns = timed(lambda: BroadcastFrame(payload).asgi_message(TEXT))
+        pack_ns = timed(lambda: BroadcastFrame(payload).asgi_message(MSGPACK))
+        print(f"{name:<22}{json_ns:>10.0f}{pack_ns:>10.0f}")
+
+    json_ns = timed(lambda: decode_inbound(inbound_text, TEXT))
+    pack_ns = timed(lambda: decode_inbound(inbound_bytes, MSGPACK))
+    print(f"{'inbound decode':<22}{json_ns:>10.0f}{pack_ns:>10.0f}")
+
+    for name, payload in (('live size', live), ('historical size', historical), ('inbound size', inbound)):
+        frame = BroadcastFrame(payload)
+        print(f"{name:<22}{len(frame.data):>10}{len(frame.packed):>10}")
+
+
+if __name__ == '__main__':
+    main()
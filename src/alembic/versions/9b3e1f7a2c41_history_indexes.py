@@ -0,0 +1,45 @@
+"""history indexes
+
+Revision ID: 9b3e1f7a2c41
+Revises: 5fe414692719
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b3e1f7a2c41'
+down_revision: Union[str, None] = '5fe414692719'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY can't run inside a transaction, the tables stay writable while the indexes build
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_messages_room_history',
+            'messages',
+            ['room_type', 'room_id', sa.text('id DESC')],
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+        op.create_index(
+            'ix_directs_pair_history',
+            'directs',
+            ['actor_id', 'recipient_id', 'id'],
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_directs_pair_history', table_name='directs', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_messages_room_history', table_name='messages', postgresql_concurrently=True, if_exists=True)
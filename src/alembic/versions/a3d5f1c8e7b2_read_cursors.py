@@ -0,0 +1,34 @@
+"""read cursors
+
+Revision ID: a3d5f1c8e7b2
+Revises: f7c3d9e2b415
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d5f1c8e7b2'
+down_revision: Union[str, None] = 'f7c3d9e2b415'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('read_cursors',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('conversation', sa.String(), nullable=False),
+    sa.Column('last_read_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text("timezone('UTC', now())"), nullable=False),
+    sa.PrimaryKeyConstraint('user_id', 'conversation')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('read_cursors')
@@ -0,0 +1,118 @@
+"""partition chat tables by month
+
+Revision ID: e4b8a1c6d902
+Revises: d2a7c5e81f03
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b8a1c6d902'
+down_revision: Union[str, None] = 'd2a7c5e81f03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Months created ahead here, the manage_chat_partitions task keeps this up afterwards
+PREMAKE_MONTHS = 3
+
+MESSAGES_COLUMNS = 'id, room_id, room_type, user_id, message, created_at, is_read, deleted_at'
+DIRECTS_COLUMNS = 'id, actor_id, recipient_id, conversation_id, message, created_at'
+
+
+def _created_at_column() -> sa.Column:
+    return sa.Column('created_at', sa.DateTime(), server_default=sa.text("timezone('UTC', now())"), nullable=False)
+
+def _id_column(table: str) -> sa.Column:
+    # The serial sequence of the old table is kept, ids continue where they were
+    return sa.Column('id', sa.Integer(), server_default=sa.text(f"nextval('{table}_id_seq'::regclass)"), nullable=False)
+
+def _message_columns(table: str) -> list:
+    return [
+        _id_column(table),
+        sa.Column('room_id', sa.String(), nullable=False),
+        sa.Column('room_type', sa.String(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('message', sa.String(), nullable=False),
+        _created_at_column(),
+        sa.Column('is_read', sa.Boolean(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+    ]
+
+def _direct_columns(table: str) -> list:
+    return [
+        _id_column(table),
+        sa.Column('actor_id', sa.String(), nullable=False),
+        sa.Column('recipient_id', sa.String(), nullable=False),
+        sa.Column('conversation_id', sa.String(), nullable=False),
+        sa.Column('message', sa.String(), nullable=False),
+        _created_at_column(),
+    ]
+
+def _create_partitions(table: str, source: str) -> None:
+    """Monthly partitions from the oldest row of source up to PREMAKE_MONTHS ahead"""
+    op.execute(f"""
+        DO $$
+        DECLARE month date;
+        BEGIN
+            FOR month IN SELECT generate_series(
+                date_trunc('month', coalesce((SELECT min(created_at) FROM {source}), timezone('UTC', now()))),
+                date_trunc('month', timezone('UTC', now())) + interval '{PREMAKE_MONTHS} months',
+                interval '1 month'
+            ) LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF {table} FOR VALUES FROM (%L) TO (%L)',
+                    '{table}_p' || to_char(month, 'YYYY_MM'),
+                    month,
+                    month + interval '1 month'
+                );
+            END LOOP;
+        END $$
+    """)
+
+def _create_indexes(table: str) -> None:
+    # On a partitioned parent every partition, present and future, gets its own copy
+    if table == 'messages':
+        op.create_index('ix_messages_room_history', 'messages', ['room_type', 'room_id', sa.text('id DESC')])
+    else:
+        op.create_index('ix_directs_conversation_history', 'directs', ['conversation_id', sa.text('id DESC')])
+
+def _swap(table: str, columns: list, copied: str, partitioned: bool) -> None:
+    """Renames table away, builds the new one under its name, copies the rows and drops the old one"""
+    old = f"{table}_old"
+    op.rename_table(table, old)
+    op.execute(f'ALTER TABLE {old} RENAME CONSTRAINT {table}_pkey TO {old}_pkey')
+
+    if partitioned:
+        op.create_table(
+            table,
+            *columns,
+            sa.PrimaryKeyConstraint('id', 'created_at', name=f'{table}_pkey'),
+            postgresql_partition_by='RANGE (created_at)'
+        )
+        _create_partitions(table, old)
+    else:
+        op.create_table(table, *columns, sa.PrimaryKeyConstraint('id', name=f'{table}_pkey'))
+
+    op.execute(f'INSERT INTO {table} ({copied}) SELECT {copied} FROM {old}')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+    op.drop_table(old)
+    _create_indexes(table)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Runs in one transaction, both tables are locked while their rows are copied
+    _swap('messages', _message_columns('messages'), MESSAGES_COLUMNS, partitioned=True)
+    _swap('directs', _direct_columns('directs'), DIRECTS_COLUMNS, partitioned=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Rows of partitions detached by the retention task are not brought back
+    _swap('messages', _message_columns('messages'), MESSAGES_COLUMNS, partitioned=False)
+    _swap('directs', _direct_columns('directs'), DIRECTS_COLUMNS, partitioned=False)
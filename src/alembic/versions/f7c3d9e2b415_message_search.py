@@ -0,0 +1,63 @@
+"""message search
+
+Revision ID: f7c3d9e2b415
+Revises: e4b8a1c6d902
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7c3d9e2b415'
+down_revision: Union[str, None] = 'e4b8a1c6d902'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Must match SEARCH_VECTOR in models/chat.py
+SEARCH_VECTOR = "to_tsvector('simple', message)"
+
+INDEXES = {'messages': 'ix_messages_search', 'directs': 'ix_directs_search'}
+
+PARTITIONS = sa.text("""
+    SELECT c.relname FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = CAST(:table AS regclass)
+""")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A stored column is computed once per row, ranking reads it instead of parsing every match again
+    for table in INDEXES:
+        op.add_column(
+            table,
+            sa.Column('search_vector', TSVECTOR(), sa.Computed(SEARCH_VECTOR, persisted=True), nullable=False)
+        )
+
+    with op.get_context().autocommit_block():
+        for table, index in INDEXES.items():
+            if op.get_context().as_sql:
+                op.create_index(index, table, ['search_vector'], postgresql_using='gin', if_not_exists=True)
+                continue
+
+            # CONCURRENTLY is not allowed on a partitioned parent: the parent gets an invalid
+            # index of its own, every partition is indexed online and attached, which validates it
+            op.execute(f'CREATE INDEX IF NOT EXISTS {index} ON ONLY {table} USING gin (search_vector)')
+            for partition in op.get_bind().execute(PARTITIONS, {'table': table}).scalars().all():
+                op.execute(
+                    f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition}_search_idx '
+                    f'ON {partition} USING gin (search_vector)'
+                )
+                op.execute(f'ALTER INDEX {index} ATTACH PARTITION {partition}_search_idx')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, index in INDEXES.items():
+        op.drop_index(index, table_name=table, if_exists=True)
+        op.drop_column(table, 'search_vector')
@@ -11,6 +11,7 @@ from src.core.dependencies.auth_injection import GET_CURRENT_USER, AuthDependenc
 from src.api.v1.utils.render_auth import render_mfa_form, render_pass_form
 from src.api.v1.utils.render_MFA import render_qr_code
 from src.core.config.config import main_prefix, EXTERNAL_BASE_URL, profile_prefix
+from src.core.services.cache.user_cache import user_cache
 from src.api.v1.utils.render_pass_flow import (
     render_after_send_email
     )
@@ -103,6 +104,7 @@ async def enable_mfa(
 
     await auth_service.session.commit()
     await auth_service.session.refresh(user)
+    await user_cache.invalidate(user.id)
     
     response = RedirectResponse(url=f'{EXTERNAL_BASE_URL}{profile_prefix}', status_code=302)
     return response
@@ -131,6 +133,7 @@ async def disable_mfa(
 
     await auth_service.session.commit()
     await auth_service.session.refresh(user)
+    await user_cache.invalidate(user.id)
 
     
     response = RedirectResponse(url=f'{EXTERNAL_BASE_URL}{profile_prefix}', status_code=302)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Form, HTTPException, Query
+from fastapi import APIRouter, Form, HTTPException, Query, status
 from fastapi.requests import Request
 from fastapi.responses import RedirectResponse, Response
 from sqlalchemy.exc import IntegrityError
@@ -12,11 +12,24 @@ from src.core.dependencies.auth_injection import AuthDependency, GET_CURRENT_ACT
 from src.api.v1.utils.render_auth import render_login_form, render_register_form, render_mfa_form
 from src.utils.time_check import time_checker
 from src.core.services.cache.auth_redis import check_login_attempts
+from src.core.services.auth.infrastructure.services.Bcryptprovider import hash_pool
 
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix=main_prefix, tags=['auth'])
 
+
+async def render_login_busy(request: Request, form_data: dict):
+    """429 while the hash pool is full, the attempt is not counted against the user"""
+    response = await render_login_form(
+        request,
+        errors='Too many logins at once, try again in a moment',
+        form_data=form_data
+    )
+    response.status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    response.headers['Retry-After'] = '1'
+    return response
+
 @router.get('/MFA_login')
 async def get_MFA_login(
     request:Request,
@@ -77,6 +90,9 @@ async def handle_login(
     """Handle POST requests for login form submission"""
 
     form_data = {'login': login}
+    if hash_pool.saturated:
+        return await render_login_busy(request, form_data)
+
     attempts_expired = await check_login_attempts(user_identifier=login)
 
     logger.debug(form_data)
@@ -113,6 +129,8 @@ async def handle_login(
             return response
         
     except HTTPException as err:
+        if err.status_code == status.HTTP_429_TOO_MANY_REQUESTS:
+            return await render_login_busy(request, form_data)
         logger.error(f"Login failed: {err}")
         if hasattr(err, 'detail'):
             detail = str(err.detail)
@@ -176,6 +194,17 @@ async def handle_register(
                 }
             )
         
+        except HTTPException as err:
+            logger.error(f'{err}')
+            return await render_register_form(
+                request,
+                errors=str(err.detail),
+                form_data={
+                    'login': login,
+                    'email': email,
+                }
+            )
+
         except ValidationError as err:
             logger.error(f'{err}')
             return await render_register_form(
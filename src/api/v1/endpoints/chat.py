@@ -1,24 +1,29 @@
 from fastapi import WebSocket, WebSocketDisconnect, APIRouter,Request, Query, Form
-from fastapi.responses import RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse
 from typing import Optional
 import logging
-import json
 
 from src.core.config.config import templates
 from src.utils.prepared_response import prepare_template 
 from src.core.dependencies.db_injection import db_helper
-from src.core.dependencies.auth_injection import GET_CURRENT_ACTIVE_USER, create_auth_provider
-from src.core.dependencies.chat_injection import HTTPChantManagerDI, WSChantManagerDI
+from src.core.dependencies.auth_injection import GET_CURRENT_PRINCIPAL, create_auth_provider
+from src.core.dependencies.chat_injection import HTTPChantManagerDI, WSChantManagerDI, PresenceDI
+from src.core.schemas.message_shema import conversation_key
+from src.core.services.cache.unread_counters import room_conversation, direct_conversation
 
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Linked from rooms.html
+PUBLIC_ROOMS = (('general', 'main'), ('gaming', 'main'), ('movies', 'main'))
+
 @router.get('/rooms')
 async def rooms_connection(
     request: Request,
-    user:GET_CURRENT_ACTIVE_USER,
-    chat_manager:HTTPChantManagerDI
+    user:GET_CURRENT_PRINCIPAL,
+    chat_manager:HTTPChantManagerDI,
+    presence:PresenceDI
 ):
     logger.debug(chat_manager._room_serv)
 
@@ -26,6 +31,15 @@ async def rooms_connection(
         auth = create_auth_provider(db_session)
         active_users = await auth._user.get_all_active_users(auth.session)
         private_rooms = await chat_manager._room_serv.get_available_rooms()
+        # Counts of every worker, one redis read
+        online = await presence.online_counts()
+
+        rooms = {f"{room_type}/{room_id}": room_conversation(room_type, room_id) for room_type, room_id in PUBLIC_ROOMS}
+        directs = {
+            item.login: direct_conversation(conversation_key(str(user.id), str(item.id)))
+            for item in active_users if item.id != user.id
+        }
+        unread = await chat_manager._db_service.unread_counts(str(user.id), [*rooms.values(), *directs.values()])
 
         logger.debug(private_rooms)
 
@@ -36,7 +50,10 @@ async def rooms_connection(
         add_date = {
             'other_rooms':private_rooms,
             'users':active_users,
-            'user':user
+            'user':user,
+            'online':online,
+            'unread_rooms':{room: unread[key] for room, key in rooms.items() if key in unread},
+            'unread_directs':{login: unread[key] for login, key in directs.items() if key in unread}
         }
         
         template_response_body_data = await prepare_template(
@@ -53,7 +70,7 @@ async def rooms_connection(
 @router.get('/chat/{room_type}/{room_name}')
 async def general_chats_room(
     request: Request, 
-    user: GET_CURRENT_ACTIVE_USER, 
+    user: GET_CURRENT_PRINCIPAL, 
     room_type:str, 
     room_name: str,
     chat_manager:HTTPChantManagerDI
@@ -90,6 +107,57 @@ async def general_chats_room(
         context=template_response_body_data
     )
 
+@router.get('/chat/{room_type}/{room_name}/history')
+async def room_history(
+    user: GET_CURRENT_PRINCIPAL,
+    room_type:str,
+    room_name: str,
+    chat_manager:HTTPChantManagerDI,
+    password:Optional[str] = Query(None),
+    limit:int = Query(50, ge=1, le=200),
+    before_id:Optional[int] = Query(None),
+    after_id:Optional[int] = Query(None)
+):
+    """Keyset paginated history for infinite scroll, pass before_id back to load older messages"""
+    if not await chat_manager._room_serv.can_read(str(user.id), room_type, room_name, password):
+        return JSONResponse({'detail': 'No access to this room'}, status_code=403)
+
+    messages = await chat_manager._db_service.receive_messages(
+        chat_manager.session,
+        room_type,
+        room_name,
+        str(user.id),
+        limit=limit,
+        before_id=before_id,
+        after_id=after_id
+    )
+    return {
+        'messages': [chat_manager._db_service.history_item(msg) for msg in messages],
+        'before_id': messages[0].id if messages else None,
+        'after_id': messages[-1].id if messages else None
+    }
+
+@router.post('/chat/{room_type}/{room_name}/read')
+async def room_read(
+    user: GET_CURRENT_PRINCIPAL,
+    room_type:str,
+    room_name: str,
+    chat_manager:HTTPChantManagerDI,
+    message_id:Optional[int] = Query(None)
+):
+    """Marks the room read up to message_id, clears the unread badge"""
+    await chat_manager._db_service.mark_read(
+        chat_manager.session,
+        str(user.id),
+        room_conversation(room_type, room_name),
+        message_id
+    )
+    return {'last_read_id': await chat_manager._db_service.read_cursor(
+        chat_manager.session,
+        str(user.id),
+        room_conversation(room_type, room_name)
+    )}
+
 @router.websocket("/ws/chat/{room_type}/{room_name}")
 async def chat_endpoint(
     websocket: WebSocket,
@@ -102,7 +170,7 @@ async def chat_endpoint(
 ):
     # Connect to WebSocket
     logger.debug(f'In websocket: {chat_manager._room_serv.rooms}')
-    await chat_manager._msg_repo.connection_manager.connect(websocket, user_id)
+    connection = await chat_manager._msg_repo.connection_manager.connect(websocket, user_id)
     
     try:
         # Validate and join room
@@ -112,23 +180,29 @@ async def chat_endpoint(
             return"""
         
         logger.debug(f'{user_id} tries to join {room_name}')
-        await chat_manager._msg_repo.connection_manager.join_room(user_id, room_type, room_name, chat_manager._room_serv)
+        await chat_manager._msg_repo.connection_manager.join_room(user_id, room_type, room_name, chat_manager._room_serv, connection)
         logger.debug(chat_manager._room_serv.rooms)
         
-        # Load message history
+        # Load message history, what the user was shown counts as read
         await chat_manager._db_service.load_message_history(
             chat_manager.session, 
             chat_manager._msg_repo.connection_manager,
             chat_manager._room_serv, 
             room_type, 
             room_name, 
-            user_id
+            user_id,
+            connection=connection
         )
+        # Only the badge here, the cursor is written once when the socket closes
+        await chat_manager._db_service.mark_read(chat_manager.session, user_id, room_conversation(room_type, room_name))
         
         # Main message loop
         while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            try:
+                message = await connection.receive()
+            except ValueError:
+                await chat_manager._msg_repo.connection_manager.send_error('Invalid message format', user_id, connection)
+                continue
             
             # Add sender info to message
             message['sender'] = user_login
@@ -142,21 +216,24 @@ async def chat_endpoint(
                 room_type,
                 room_name,
                 user_id,
-                user_login
+                user_login,
+                connection
             )
                 
     except WebSocketDisconnect:
         logger.info(f"User {user_login} disconnected")
     finally:
         logger.info(f"In finally body")
-        await chat_manager._msg_repo.connection_manager.leave_room(user_id, room_type, room_name, chat_manager._room_serv)
-        await chat_manager._msg_repo.connection_manager.disconnect(user_id, chat_manager._room_serv)
+        # Messages that arrived while the socket was open were seen live
+        await chat_manager._db_service.close_room_read(chat_manager.session, user_id, room_type, room_name)
+        await chat_manager._msg_repo.connection_manager.leave_room(user_id, room_type, room_name, chat_manager._room_serv, connection)
+        await chat_manager._msg_repo.connection_manager.disconnect(user_id, chat_manager._room_serv, connection)
 
 
 @router.post("/create_room")
 async def create_protected_room(
     request: Request,
-    user: GET_CURRENT_ACTIVE_USER,
+    user: GET_CURRENT_PRINCIPAL,
     chat_manager:HTTPChantManagerDI,
     name: str = Form(...),
     password: Optional[str] = Form(None),
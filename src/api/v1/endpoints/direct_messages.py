@@ -1,11 +1,14 @@
 from fastapi import WebSocket, WebSocketDisconnect, APIRouter,Request, Query
-import json
+from fastapi.responses import JSONResponse
+from typing import Optional
 import logging
 
 from src.core.config.config import templates
 from src.utils.prepared_response import prepare_template 
-from src.core.dependencies.auth_injection import GET_CURRENT_ACTIVE_USER, AuthDependency
+from src.core.dependencies.auth_injection import GET_CURRENT_PRINCIPAL, AuthDependency
 from src.core.dependencies.chat_injection import HTTPChantManagerDI, WSChantManagerDI
+from src.core.schemas.message_shema import conversation_key
+from src.core.services.cache.unread_counters import direct_conversation
 
 
 router = APIRouter()
@@ -15,7 +18,7 @@ logger = logging.getLogger(__name__)
 @router.get('/direct-message-with-{username}')
 async def direct_message_endpoint(
     request:Request,
-    user:GET_CURRENT_ACTIVE_USER,
+    user:GET_CURRENT_PRINCIPAL,
     username:str,
     auth:AuthDependency
 ):
@@ -41,6 +44,52 @@ async def direct_message_endpoint(
         context=template_response_body_data
     )
 
+@router.get('/direct-message-with-{username}/history')
+async def direct_message_history(
+    user:GET_CURRENT_PRINCIPAL,
+    username:str,
+    auth:AuthDependency,
+    chat_manager:HTTPChantManagerDI,
+    limit:int = Query(50, ge=1, le=200),
+    before_id:Optional[int] = Query(None),
+    after_id:Optional[int] = Query(None)
+):
+    """Keyset paginated history of the conversation with username, pass before_id back to load older messages"""
+    recipient_user = await auth._user._repo.get_user_for_auth(auth.session, username)
+    if recipient_user is None:
+        return JSONResponse({'detail': 'User not found'}, status_code=404)
+
+    messages = await chat_manager._db_service.receive_messages_direct(
+        chat_manager.session,
+        str(user.id),
+        str(recipient_user.id),
+        limit=limit,
+        before_id=before_id,
+        after_id=after_id
+    )
+    return {
+        'messages': [chat_manager._db_service.history_item(msg) for msg in messages],
+        'before_id': messages[0].id if messages else None,
+        'after_id': messages[-1].id if messages else None
+    }
+
+@router.post('/direct-message-with-{username}/read')
+async def direct_message_read(
+    user:GET_CURRENT_PRINCIPAL,
+    username:str,
+    auth:AuthDependency,
+    chat_manager:HTTPChantManagerDI,
+    message_id:Optional[int] = Query(None)
+):
+    """Marks the conversation with username read up to message_id, clears the unread badge"""
+    recipient_user = await auth._user._repo.get_user_for_auth(auth.session, username)
+    if recipient_user is None:
+        return JSONResponse({'detail': 'User not found'}, status_code=404)
+
+    conversation = direct_conversation(conversation_key(str(user.id), str(recipient_user.id)))
+    await chat_manager._db_service.mark_read(chat_manager.session, str(user.id), conversation, message_id)
+    return {'last_read_id': await chat_manager._db_service.read_cursor(chat_manager.session, str(user.id), conversation)}
+
 @router.websocket("/ws/direct-message-with-{username}")
 async def direct_message_endpoint_websocket(
     websocket: WebSocket,
@@ -52,25 +101,33 @@ async def direct_message_endpoint_websocket(
 ):
     logger.debug(f"{recipient_id=} {actor_id=}")
 
-    await chat_manager._msg_repo.connection_manager.connect(websocket, actor_id)
+    connection = await chat_manager._msg_repo.connection_manager.connect(websocket, actor_id)
+    conversation = direct_conversation(conversation_key(actor_id, recipient_id))
 
     try:
         
         logger.debug(f'{actor_id} tries to join {recipient_id}')
         await chat_manager._room_serv.create_direct(actor_id, recipient_id)
+        await chat_manager._msg_repo.connection_manager.join_direct(connection, recipient_id)
 
         await chat_manager._db_service.load_message_history_direct(
             chat_manager.session, 
             chat_manager._msg_repo.connection_manager,
             chat_manager._room_serv, 
             recipient_id, 
-            actor_id
+            actor_id,
+            connection=connection
         )
+        # Only the badge here, the cursor is written once when the socket closes
+        await chat_manager._db_service.mark_read(chat_manager.session, actor_id, conversation)
 
         # Main message loop
         while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            try:
+                message = await connection.receive()
+            except ValueError:
+                await chat_manager._msg_repo.connection_manager.send_error('Invalid message format', actor_id, connection)
+                continue
             
             # Add sender info to message
             message['recipient_id'] = recipient
@@ -84,11 +141,12 @@ async def direct_message_endpoint_websocket(
                 actor_id,
                 recipient_id,
                 actor,
+                connection
             )
                 
     except WebSocketDisconnect:
         logger.info(f"User {actor_id} disconnected")
     finally:
         logger.info(f"In finally body")
-        await chat_manager._room_serv.leave_direct(actor_id, recipient_id)
-        await chat_manager._msg_repo.connection_manager.disconnect(actor_id, chat_manager._room_serv)
\ No newline at end of file
+        await chat_manager._db_service.close_direct_read(chat_manager.session, actor_id, recipient_id)
+        await chat_manager._msg_repo.connection_manager.disconnect(actor_id, chat_manager._room_serv, connection)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Request, status
 import logging
 
 from src.core.dependencies.db_injection import DBDI, db_helper
@@ -31,3 +31,22 @@ async def trigger_health_check():
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Database health check failed"
         )
+
+
+@router.get('/health/history-cache')
+async def history_cache_stats(request: Request):
+    """Hit ratio of the shared room history cache"""
+    try:
+        return await request.app.state.history_cache.stats()
+    except Exception as err:
+        logger.error(err)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="History cache unavailable"
+        )
+
+
+@router.get('/health/user-cache')
+async def user_cache_stats(request: Request):
+    """Hit ratio of this worker's auth user cache"""
+    return request.app.state.user_cache.stats()
@@ -0,0 +1,81 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse
+from typing import Optional
+import logging
+
+from src.core.dependencies.auth_injection import GET_CURRENT_PRINCIPAL, AuthDependency
+from src.core.dependencies.chat_injection import HTTPChantManagerDI
+
+
+router = APIRouter(tags=['search'])
+logger = logging.getLogger(__name__)
+
+
+def _page(results: list, limit: int) -> dict:
+    """Pass before_rank and before_id back for the next page, both are None on the last one"""
+    last = results[-1] if len(results) == limit else None
+    return {
+        'results': results,
+        'before_rank': last['rank'] if last else None,
+        'before_id': int(last['id']) if last else None
+    }
+
+@router.get('/search/messages')
+async def search_room_messages(
+    user: GET_CURRENT_PRINCIPAL,
+    chat_manager: HTTPChantManagerDI,
+    q: str = Query(..., min_length=1, max_length=200),
+    room_type: Optional[str] = Query(None),
+    room_name: Optional[str] = Query(None),
+    password: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    before_rank: Optional[float] = Query(None),
+    before_id: Optional[int] = Query(None)
+):
+    """Ranked search over one room the user may read, or over the rooms the user has opened when no room is given"""
+    if (room_type is None) != (room_name is None):
+        return JSONResponse({'detail': 'room_type and room_name go together'}, status_code=422)
+    if room_name is not None and not await chat_manager._room_serv.can_read(str(user.id), room_type, room_name, password):
+        return JSONResponse({'detail': 'No access to this room'}, status_code=403)
+
+    results = await chat_manager._db_service.search(
+        chat_manager.session,
+        q,
+        str(user.id),
+        limit,
+        room_type=room_type,
+        room_id=room_name,
+        before_rank=before_rank,
+        before_id=before_id
+    )
+    return _page(results, limit)
+
+@router.get('/search/directs')
+async def search_direct_messages(
+    user: GET_CURRENT_PRINCIPAL,
+    auth: AuthDependency,
+    chat_manager: HTTPChantManagerDI,
+    q: str = Query(..., min_length=1, max_length=200),
+    username: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    before_rank: Optional[float] = Query(None),
+    before_id: Optional[int] = Query(None)
+):
+    """Ranked search over the user's own conversations, or the one with username"""
+    peer_id = None
+    if username is not None:
+        peer = await auth._user._repo.get_user_for_auth(auth.session, username)
+        if peer is None:
+            return JSONResponse({'detail': 'User not found'}, status_code=404)
+        peer_id = str(peer.id)
+
+    results = await chat_manager._db_service.search_direct(
+        chat_manager.session,
+        q,
+        str(user.id),
+        limit,
+        peer_id=peer_id,
+        before_rank=before_rank,
+        before_id=before_id
+    )
+    return _page(results, limit)
@@ -11,7 +11,9 @@ from src.core.config.models import (
     DatabaseConfig, 
     RedisSettings, 
     Email_Settings,
-    JwtConfig
+    JwtConfig,
+    ChatSettings,
+    AuthSettings
     )
 
 
@@ -37,6 +39,8 @@ class Settings(BaseSettings):
     jwt:JwtConfig
     redis: RedisSettings
     email:Email_Settings
+    chat:ChatSettings = ChatSettings()
+    auth:AuthSettings = AuthSettings()
 
     # API
     #...
@@ -53,7 +57,8 @@ class Settings(BaseSettings):
         directories = [
             self.frontend_root,
             self.static_root,
-            self.media_root
+            self.media_root,
+            self.archive_root
         ]
         for directory in directories:
             os.makedirs(directory, exist_ok=True)
@@ -73,6 +78,10 @@ class Settings(BaseSettings):
     @property
     def media_root(self) -> Path:
         return self.base_dir / 'media'
+
+    @property
+    def archive_root(self) -> Path:
+        return Path(self.chat.archive_dir) if self.chat.archive_dir else self.base_dir / 'archive'
     
     @property
     def default_picture_none(self) -> Path:
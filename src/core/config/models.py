@@ -1,6 +1,6 @@
 from pydantic import BaseModel, field_validator, SecretStr
 from datetime import timedelta
-from typing import Union
+from typing import List, Union
 
 
 class RunConfig(BaseModel):
@@ -40,6 +40,8 @@ class RedisSettings(BaseModel):
     cache_time:timedelta = timedelta(hours=1)
     cache_time_auth:timedelta = timedelta(minutes=5)
     cache_auth_attempts:int = 5
+    user_cache_size:int = 10000 # users kept in process by the auth middleware, 0 disables
+    user_cache_ttl:float = 60.0 # seconds, bounds staleness if an invalidation is missed
 
     @field_validator('cache_time', mode='before')
     @classmethod
@@ -66,6 +68,79 @@ class RedisSettings(BaseModel):
             raise ValueError(f"Could not parse timedelta from value: {value}")
         
 
+class ChatSettings(BaseModel):
+    """
+    backplane:bool default - True, fan-out between workers over redis pub/sub
+    channel_prefix:str default - chat
+    send_timeout:float default - 2.0, seconds a single socket send may take before eviction
+    outbound_queue_size:int default - 256, frames buffered per connection
+    overflow_policy:str default - drop_oldest, one of drop_oldest / coalesce / disconnect
+    compression:bool default - False, precompressed frames for clients offering chat.deflate
+    shards:bool default - False, rooms are owned by one worker picked by consistent hashing, needs backplane
+    shard_vnodes:int default - 64, points per worker on the hash ring
+    shard_socket_dir:str default - /tmp/chat-shards, unix sockets used to forward messages to the owner
+    shard_heartbeat:float default - 2.0, seconds between worker heartbeats, a worker silent for 3 beats leaves the ring
+    shard_host:str default - '', scope of the shard ring, workers sharing it must share shard_socket_dir, empty means the hostname
+    batch_window_ms:float default - 5.0, how long a batching room holds messages before one frame goes out
+    batch_max_messages:int default - 32, a batch is sent early once this many messages wait
+    batch_rooms:List[str] default - [], rooms batching from the start, as "room_type/room_name"
+    ping_interval:float default - 20.0, seconds of silence before the server pings a socket, also the presence tick
+    idle_timeout:float default - 60.0, seconds of silence after which a socket is reaped
+    presence_ttl:int default - 60, seconds a worker's online counts live in redis without a refresh
+    write_behind:bool default - True, messages are queued and inserted in batches instead of one commit each
+    write_batch_ms:float default - 50.0, longest a message waits in the queue before a flush
+    write_batch_size:int default - 500, a flush starts early once this many messages wait
+    write_queue_size:int default - 10000, senders wait for the database only when this many are queued
+    history_cache_size:int default - 50, messages kept per room in the shared redis history cache
+    history_cache_ttl:int default - 3600, seconds an untouched room stays in the history cache
+    history_frames:int default - 256, encoded history frames a worker keeps, least recently used go first
+    partition_premake_months:int default - 3, monthly partitions of messages/directs created ahead of time
+    partition_retention_months:int default - 0, full months kept besides the current one, 0 keeps everything
+    partition_drop_expired:bool default - False, expired partitions are dropped instead of only detached
+    archive_dir:str default - '', cold storage for old history, empty means src/archive
+    archive_after_months:int default - 0, full months kept in the database besides the current one, 0 disables archiving
+    archive_chunk_rows:int default - 10000, rows read per query and written per segment file
+    search_candidates:int default - 1000, newest matches of a search that get ranked, bounds the cost of common words
+    """
+    backplane:bool = True
+    channel_prefix:str = 'chat'
+    send_timeout:float = 2.0
+    outbound_queue_size:int = 256
+    overflow_policy:str = 'drop_oldest'
+    compression:bool = False
+    shards:bool = False
+    shard_vnodes:int = 64
+    shard_socket_dir:str = '/tmp/chat-shards'
+    shard_heartbeat:float = 2.0
+    shard_host:str = ''
+    batch_window_ms:float = 5.0
+    batch_max_messages:int = 32
+    batch_rooms:List[str] = []
+    ping_interval:float = 20.0
+    idle_timeout:float = 60.0
+    presence_ttl:int = 60
+    write_behind:bool = True
+    write_batch_ms:float = 50.0
+    write_batch_size:int = 500
+    write_queue_size:int = 10000
+    history_cache_size:int = 50
+    history_cache_ttl:int = 3600
+    history_frames:int = 256
+    partition_premake_months:int = 3
+    partition_retention_months:int = 0
+    partition_drop_expired:bool = False
+    archive_dir:str = ''
+    archive_after_months:int = 0
+    archive_chunk_rows:int = 10000
+    search_candidates:int = 1000
+
+    @field_validator('overflow_policy')
+    def validate_overflow_policy(cls, v):
+        if v not in ('drop_oldest', 'coalesce', 'disconnect'):
+            raise ValueError("Overflow policy must be drop_oldest, coalesce or disconnect")
+        return v
+
+
 class CurrentDB(BaseModel):
     database:str = 'postgres'
 
@@ -120,4 +195,15 @@ class JwtConfig(BaseModel):
     key:SecretStr = 'base_key'
     algorithm:str = 'HS256'
     ACCESS_TOKEN_EXPIRE_MINUTES:int = 15
-    REFRESH_TOKEN_EXPIRE_DAYS:int = 7
\ No newline at end of file
+    REFRESH_TOKEN_EXPIRE_DAYS:int = 7
+
+
+class AuthSettings(BaseModel):
+    """
+    hash_workers:int default - 2, threads running bcrypt, at most this many hashes run at once
+    hash_queue_size:int default - 8, hashes waiting for a thread, past that logins get 429
+    stateless_access:bool default - False, a valid access token is trusted on its claims, only the redis revocation cut-off is checked
+    """
+    hash_workers:int = 2
+    hash_queue_size:int = 8
+    stateless_access:bool = False
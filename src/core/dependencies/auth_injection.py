@@ -11,6 +11,7 @@ from src.core.services.auth.infrastructure.services.User_Crud import UserService
 from src.core.services.auth.infrastructure.services.EmailService import EmailService
 from src.core.services.auth.infrastructure.services.UserService import UserServiceAuth
 from src.core.services.auth.domain.models.user import UserModel
+from src.core.services.cache.user_cache import UserSnapshot
 from src.core.exceptions.auth_exception import auth_demand_exception, inactive_user_exception
 
 
@@ -73,6 +74,21 @@ def get_auth_provider(
         user_service=user_service
         )
 
+async def resolve_current_user(request:Request, auth_service:AuthProvider) -> Optional[UserModel]:
+    """
+    The user of the request, loaded once however many auth dependencies ask for it.
+    The token was already decoded by the middleware, a user its snapshot found missing
+    is not looked up again.
+    """
+    if hasattr(request.state, 'user'):
+        return request.state.user
+
+    if getattr(request.state, 'identity', True) is None:
+        request.state.user = None
+    else:
+        request.state.user = await auth_service._user.gather_user_data(request=request, session=auth_service.session)
+    return request.state.user
+
 # Current user dependency
 async def get_current_user(
     request:Request,
@@ -84,7 +100,7 @@ async def get_current_user(
         raise auth_demand_exception
     
     try:
-        user = await auth_service._user.gather_user_data(request=request, session=auth_service.session)
+        user = await resolve_current_user(request, auth_service)
 
         if user is None:
             logger.info('Someone tried to reach endpoint')
@@ -105,6 +121,26 @@ async def get_current_active_user(
         raise inactive_user_exception
     return current_user
 
+# Current user without the database row
+async def get_current_principal(
+    request:Request,
+    token: str = Depends(get_token_from_cookie),
+    auth_service: AuthProvider = Depends(get_auth_provider)
+) -> UserSnapshot:
+    """For endpoints that only need who the user is: no SQL in stateless mode or on a user cache hit"""
+    if token is None:
+        logger.info('Someone tried to reach endpoint')
+        raise auth_demand_exception
+
+    user = await auth_service._user.principal(auth_service.session, request)
+    if user is None:
+        logger.info('Someone tried to reach endpoint')
+        raise auth_demand_exception
+    if not user.is_active:
+        logger.info('Someone tried to reach endpoint')
+        raise inactive_user_exception
+    return user
+
 # Auth provider factory for middleware
 def create_auth_provider(db_session):
     token_service = JWTService()
@@ -136,7 +172,7 @@ async def get_current_user_for_email(
         return None
     
     try:
-        user = await auth_service._user.gather_user_data(request=request, session=auth_service.session)
+        user = await resolve_current_user(request, auth_service)
 
         if user is None:
             logger.info('Someone tried to reach endpoint')
@@ -151,4 +187,5 @@ async def get_current_user_for_email(
 AuthDependency = Annotated[AuthProvider, Depends(get_auth_provider)]
 GET_CURRENT_USER = Annotated[UserModel, Depends(get_current_user)]
 GET_CURRENT_USER_FOR_EMAIL = Annotated[Optional[UserModel], Depends(get_current_user_for_email)]
-GET_CURRENT_ACTIVE_USER = Annotated[UserModel, Depends(get_current_active_user)]
\ No newline at end of file
+GET_CURRENT_ACTIVE_USER = Annotated[UserModel, Depends(get_current_active_user)]
+GET_CURRENT_PRINCIPAL = Annotated[UserSnapshot, Depends(get_current_principal)]
\ No newline at end of file
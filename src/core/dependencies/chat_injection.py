@@ -1,4 +1,5 @@
 from fastapi import Depends, Request, WebSocket
+from fastapi.requests import HTTPConnection
 from typing import Annotated
 
 from src.core.dependencies.db_injection import DBDI
@@ -7,6 +8,7 @@ from src.core.services.chat.infrastructure.services.MessageService import Messag
 from src.core.services.chat.infrastructure.services.RoomService import RoomService
 from src.core.services.chat.infrastructure.services.ConnectionManager import ConnectionManager
 from src.core.services.chat.infrastructure.services.DBService import DBService
+from src.core.services.chat.infrastructure.services.PresenceService import PresenceService
 
 
 def get_meessage_connection_managerWS(websocket: WebSocket) -> ConnectionManager:
@@ -15,8 +17,13 @@ def get_meessage_connection_managerWS(websocket: WebSocket) -> ConnectionManager
 def get_meessage_connection_managerHTTP(request: Request) -> ConnectionManager:
     return request.app.state.con_manager
 
-def get_db_service() -> DBService:
-    return DBService()
+def get_db_service(connection: HTTPConnection) -> DBService:
+    return DBService(
+        writer=connection.app.state.message_writer,
+        history_cache=connection.app.state.history_cache,
+        archive=connection.app.state.chat_archive,
+        unread=connection.app.state.unread
+    )
 
 def get_message_serviceWS(
         conn_manager = Depends(get_meessage_connection_managerWS),
@@ -40,6 +47,9 @@ def get_ws_room_service(websocket: WebSocket) -> RoomService:
     """For WebSocket routes"""
     return websocket.app.state.room_service
 
+def get_presence_service(request: Request) -> PresenceService:
+    return request.app.state.presence
+
 def get_chat_manager_WS(
         session:DBDI, 
         message_service = Depends(get_message_serviceWS),
@@ -78,4 +88,5 @@ def get_chat_manager_manual(session):
 #ChantManagerDI = Annotated[ChatManager, Depends(get_chat_manager)]
 
 WSChantManagerDI = Annotated[ChatManager, Depends(get_chat_manager_WS)]
-HTTPChantManagerDI = Annotated[ChatManager, Depends(get_chat_manager_HTTP)]
\ No newline at end of file
+HTTPChantManagerDI = Annotated[ChatManager, Depends(get_chat_manager_HTTP)]
+PresenceDI = Annotated[PresenceService, Depends(get_presence_service)]
\ No newline at end of file
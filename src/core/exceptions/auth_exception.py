@@ -44,5 +44,11 @@ false_activation_user_exception = AuthException(
     detail="This user already active/inactive",
 )
 
+hash_busy_exception = AuthException(
+    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+    detail="Too many logins at once, try again in a moment",
+    headers={"Retry-After": "1"},
+)
+
 #def setup_exception_handlers(app: FastAPI):
     #app.add_exception_handler(AuthException, auth_exception_handler)
\ No newline at end of file
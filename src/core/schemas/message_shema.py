@@ -10,9 +10,17 @@ class MessabeSchemaBase(BaseModel):
 class MessageSchema(MessabeSchemaBase):
     message: str
 
+def conversation_key(first_id:str, second_id:str) -> str:
+    """Same key for both directions of a conversation: the two user ids in sorted order"""
+    return ':'.join(sorted((str(first_id), str(second_id))))
+
 class DirectMessage(BaseModel):
     actor_id:str
     recipient_id:str
+
+    @property
+    def conversation_id(self) -> str:
+        return conversation_key(self.actor_id, self.recipient_id)
     
 class DirectScheme(DirectMessage):
     message: str
\ No newline at end of file
@@ -1,9 +1,12 @@
+from __future__ import annotations
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.core.services.auth.domain.models.user import UserModel
-from src.core.services.auth.infrastructure.services.User_Crud import UserService
+
+if TYPE_CHECKING:
+    from src.core.services.auth.infrastructure.services.User_Crud import UserService
 
 
 class EmailRepo(ABC):
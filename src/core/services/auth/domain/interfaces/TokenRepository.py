@@ -15,6 +15,9 @@ class TokenRepository(ABC):
     @abstractmethod
     async def update_old_refresh_token(self, session:AsyncSession,  token:RefreshToken, old_token:RefreshToken) -> None: ...
 
+    @abstractmethod
+    async def rotate_refresh_token(self, session:AsyncSession, old_token:str, token:RefreshToken): ...
+
     @abstractmethod
     async def revoke_token(self, session:AsyncSession, token: str) -> None: ...
 
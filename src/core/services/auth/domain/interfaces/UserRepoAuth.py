@@ -16,6 +16,9 @@ class UserRepoAuth(ABC):
     @abstractmethod
     async def get_all_active_users(self, session:AsyncSession): ...
 
+    @abstractmethod
+    async def principal(self, session:AsyncSession, request:Request): ...
+
     @abstractmethod
     async def is_active(self, session:AsyncSession, request:Request): ...
 
@@ -15,7 +15,8 @@ from src.core.services.database.orm.token_crud import (
     select_data_token, 
     update_data_token,
     revoke_refresh_token,
-    new_token_insert
+    new_token_insert,
+    rotate_token
     )
 from src.core.services.database.orm.chat_orm import(
     select_messages,
@@ -60,49 +61,34 @@ class DatabaseTokenRepository(TokenRepository):
             except ExpiredSignatureError:
                 # gain user data from unsafe verification (only if expired) and creating new tokens
                 user_data = await jwt_service.verify_token_unsafe(request, jwt_service.REFRESH_TYPE)
+                user_data.update(self.fresh_claims(request, user_data['sub'], jwt_service))
                 logger.debug('New token pair')
                 result = await jwt_service.create_tokens(user_data)
 
                 # gain old and new tokens
                 old_refresh = request.cookies.get(jwt_service.REFRESH_TYPE)
                 new_refresh = result.get(jwt_service.REFRESH_TYPE)
-                old_token = await self.verificate_refresh_token(session, old_refresh)
 
                 logger.debug(f"{new_refresh=}")
                 logger.debug(f"{old_refresh=}")
 
-
-                # building new token scheme
+                # building new token scheme, family and device are taken from the old token when the database knows it
                 date = jwt_service.REFRESH_TOKEN_EXPIRE + datetime.now(timezone.utc)
+                new_token_scheme = await self.token_scheme_factory(
+                    user_id=user_data.get('sub'),
+                    token=new_refresh,
+                    expires_at=date,
+                    revoked=False,
+                    replaced_by_token=None,
+                    family_id=str(uuid.uuid4()),
+                    previous_token_id=None,
+                    device_info=None
+                )
 
-                if old_token:
-                    new_token_scheme = await self.token_scheme_factory(
-                        user_id=old_token.user_id,
-                        token=new_refresh,
-                        expires_at=date,
-                        revoked=False,
-                        replaced_by_token=None,
-                        family_id=old_token.family_id,
-                        previous_token_id=old_token.id,
-                        device_info=old_token.device_info
-                    )
-                else:
-                    new_token_scheme = await self.token_scheme_factory(
-                        user_id=user_data.get('sub'),
-                        token=new_refresh,
-                        expires_at=date,
-                        revoked=False,
-                        replaced_by_token=None,
-                        family_id=str(uuid.uuid4()),
-                        previous_token_id=None,
-                        device_info=None
-                    )
-
-                # new token store
-                await self.store_new_refresh_token(session, new_token_scheme)
-                
-                # update old token, revoke and replace
-                await self.update_old_refresh_token(session, new_token_scheme, old_token)
+                # revoke the old token and store the new one, one transaction
+                if not await self.rotate_refresh_token(session, old_refresh, new_token_scheme):
+                    logger.warning('Refresh token was already rotated')
+                    return None
                 return result
             
             except Exception as err:
@@ -123,7 +109,7 @@ class DatabaseTokenRepository(TokenRepository):
                     logger.debug('New access token')
                     return {
                         jwt_service.ACCESS_TYPE: await jwt_service.create_token(
-                            {'sub': refresh_payload['sub']},
+                            {'sub': refresh_payload['sub'], **self.fresh_claims(request, refresh_payload['sub'], jwt_service)},
                             jwt_service.ACCESS_TOKEN_EXPIRE,
                             jwt_service.ACCESS_TYPE
                         )
@@ -136,6 +122,18 @@ class DatabaseTokenRepository(TokenRepository):
             logger.error(f"Token rotation error: {e}")
             return None
 
+    @staticmethod
+    def fresh_claims(request:Request, sub:str, jwt_service:JWTService) -> dict:
+        """Claims of the user the middleware just looked up, not the ones the old token carried"""
+        identity = getattr(request.state, 'identity', None)
+        if identity is None or str(identity.id) != str(sub):
+            return {}
+        return jwt_service.principal_claims(identity)
+
+    @time_checker
+    async def rotate_refresh_token(self, session:AsyncSession, old_token:str, token:RefreshToken):
+        return await rotate_token(session, old_token, token)
+
     @time_checker
     async def update_old_refresh_token(self, session:AsyncSession,  token:RefreshToken, old_token:RefreshTokenModel) -> None:
         await update_data_token(session, token, old_token)
@@ -74,7 +74,8 @@ class AuthProvider(AuthRepository):
         
         # Third step 
         # gain_tokens
-        user_data = {'sub':str(user.id)}
+        # active - the user is activated right below
+        user_data = {'sub':str(user.id), **self._token.principal_claims(user), 'active':True}
         tokens = await self._token.create_tokens(user_data)
         logger.debug(f'tokens created successfully')
 
@@ -1,24 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
+from typing import Callable, TypeVar
+import asyncio
 import logging
 
 from src.core.services.auth.domain.interfaces.HashService import HashService
+from src.core.exceptions.auth_exception import AuthException, hash_busy_exception
+from src.core.config.config import settings
 from src.utils.time_check import time_checker
 
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar('T')
+
+
+class HashPool:
+    """
+    Runs bcrypt off the event loop. A cost 12 hash takes ~250 ms of CPU, inline it
+    would stall every socket of the worker for that long.
+
+    bcrypt releases the GIL while hashing, so threads run hashes in parallel.
+    At most workers hashes run and queue_size wait, anything past that is refused
+    with 429 right away instead of piling up behind a login burst.
+    """
+    def __init__(self, workers: int = settings.auth.hash_workers, queue_size: int = settings.auth.hash_queue_size):
+        self.workers = workers
+        self.limit = workers + queue_size
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+
+    @property
+    def saturated(self) -> bool:
+        return self.pending >= self.limit
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        if self.saturated:
+            logger.warning(f"Hash pool saturated, {self.pending} hashes pending")
+            raise hash_busy_exception
+
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        future = self._executor.submit(fn, *args)
+        # Released when the hash is done, not when the caller stops waiting for it
+        future.add_done_callback(lambda _: loop.is_closed() or loop.call_soon_threadsafe(self._release))
+        return await asyncio.wrap_future(future)
+
+    def _release(self):
+        self.pending -= 1
+
+
+hash_pool = HashPool()
+
+
 class Bcryptprovider(HashService):
-    def __init__(self):
+    def __init__(self, pool: HashPool = hash_pool):
         self.pwd_context = CryptContext(
             schemes=["bcrypt"],
             deprecated="auto",
             bcrypt__ident="2b",
             bcrypt__min_rounds=12)
+        self._pool = pool
 
     @time_checker
     def hash_token(self, token: str) -> str:
         return self.pwd_context.hash(token)
-    
+
     @time_checker
     async def verify_password(self, password: str, hashed_password: str) -> bool:
         if not isinstance(password, (str, bytes)):
@@ -26,11 +73,13 @@ class Bcryptprovider(HashService):
         if not isinstance(hashed_password, str):
             raise ValueError("Hashed password must be string")
         try:
-            return self.pwd_context.verify(password, hashed_password)
+            return await self._pool.run(self.pwd_context.verify, password, hashed_password)
+        except AuthException:
+            raise
         except Exception as err:
             logger.error(f"{err} {password=} {hashed_password=}")
             raise err
-        
+
     @time_checker
     async def hash_password(self, password:str) ->str:
-        return self.pwd_context.hash(password)
\ No newline at end of file
+        return await self._pool.run(self.pwd_context.hash, password)
@@ -37,10 +37,20 @@ class JWTService(TokenService):
         to_encode.update({
             "exp": expire, 
             "type": token_type,
-            "iat": date_now
+            # Fractional, a revocation cut-off must not catch a token issued later in the same second
+            "iat": date_now.timestamp()
         })
         return jwt.encode(to_encode, self.secret_key, algorithm=self.algorithm)
     
+    @staticmethod
+    def principal_claims(user) -> dict:
+        """What a stateless request needs to know about the user, read by UserSnapshot.from_claims"""
+        return {
+            'login': user.login,
+            'active': bool(user.is_active),
+            'mfa': bool(user.otp_enabled)
+        }
+
     @time_checker
     async def create_tokens(self, data:dict) -> dict:
         csrf_token = await self.generate_csrf_token()
@@ -1,5 +1,6 @@
 from fastapi import Request
 from jose.exceptions import ExpiredSignatureError
+from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 import logging
 
@@ -7,6 +8,9 @@ from src.core.services.auth.domain.models.user import UserModel
 from src.core.services.auth.domain.interfaces.UserRepoAuth import UserRepoAuth
 from src.core.services.auth.infrastructure.services.User_Crud import UserService
 from src.core.services.auth.infrastructure.services.JWTService import JWTService
+from src.core.services.cache.user_cache import UserCache, UserSnapshot, user_cache
+from src.core.services.cache.token_revocations import TokenRevocations, token_revocations
+from src.core.config.config import settings
 from src.utils.time_check import time_checker
 
 
@@ -17,9 +21,15 @@ class UserServiceAuth(UserRepoAuth):
             self, 
             user_repo: UserService, 
             token_service:JWTService,
+            cache:UserCache = user_cache,
+            revocations:TokenRevocations = token_revocations,
+            stateless:bool = settings.auth.stateless_access
             ):
         self._repo = user_repo
         self._token = token_service
+        self._cache = cache
+        self._revocations = revocations
+        self._stateless = stateless
         
     @time_checker
     async def update_profile_user(self, session:AsyncSession, user_id:int,data:dict) -> None:
@@ -33,23 +43,63 @@ class UserServiceAuth(UserRepoAuth):
     async def get_all_active_users(self, session:AsyncSession):
         return await self._repo.give_all_active_users_repo(session)
     
+    @time_checker
+    async def access_claims(self, request:Request) -> dict:
+        """
+        Claims of the access token. The token is decoded once per request, the middleware
+        does it first and the dependencies read request.state after it.
+        An expired token still identifies the user, the middleware rotates it,
+        request.state.token_fresh tells the two apart.
+        """
+        claims = getattr(request.state, 'access_claims', None)
+        if claims is not None:
+            return claims
+
+        try:
+            claims = await self._token.verify_token(request, self._token.ACCESS_TYPE)
+            request.state.token_fresh = True
+        except ExpiredSignatureError as err:
+            logger.info(f'Handled {err}')
+            claims = await self._token.verify_token_unsafe(request, self._token.ACCESS_TYPE)
+            request.state.token_fresh = False
+        request.state.access_claims = claims
+        return claims
+
+    @time_checker
+    async def identify(self, request:Request) -> int:
+        return int((await self.access_claims(request)).get('sub'))
+
+    @time_checker
+    async def principal(self, session:AsyncSession, request:Request) -> Optional[UserSnapshot]:
+        """
+        The user of the request without the full row, kept as request.state.identity.
+        In stateless mode a fresh token is trusted on its claims after one revocation
+        check, otherwise the snapshot comes from the user cache.
+        """
+        if hasattr(request.state, 'identity'):
+            return request.state.identity
+
+        claims = await self.access_claims(request)
+        user_id = int(claims.get('sub'))
+        if self._stateless and request.state.token_fresh and 'active' in claims:
+            revoked = await self._revocations.is_revoked(user_id, claims.get('iat'))
+            # None - redis could not answer, the database decides
+            if revoked is not None:
+                request.state.identity = None if revoked else UserSnapshot.from_claims(claims)
+                return request.state.identity
+
+        request.state.identity = await self._cache.load(session, user_id)
+        return request.state.identity
+
     @time_checker
     async def is_active(self, session:AsyncSession, request:Request):
-        user_data = await self.gather_user_data(session, request)
-        return user_data.is_active
+        user = await self.principal(session, request)
+        return user is not None and user.is_active
     
     @time_checker
     async def gather_user_data(self, session:AsyncSession, request:Request) -> UserModel:
         try:
-            verified_token = await self._token.verify_token(request, self._token.ACCESS_TYPE)
-            sub = int(verified_token.get('sub'))
-            return await self._repo.get_user_for_auth_by_id(session, sub)
-        
-        except ExpiredSignatureError as err:
-            logger.info(f'Handled {err}')
-            verified_token = await self._token.verify_token_unsafe(request, self._token.ACCESS_TYPE)
-            sub = int(verified_token.get('sub'))
-            return await self._repo.get_user_for_auth_by_id(session, sub)
+            return await self._repo.get_user_for_auth_by_id(session, await self.identify(request))
         except Exception as err:
             logger.critical(err)
-            raise err
\ No newline at end of file
+            raise err
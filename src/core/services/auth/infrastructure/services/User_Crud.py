@@ -6,6 +6,8 @@ from src.core.services.auth.domain.models.user import UserModel
 from src.core.schemas.user import UserSchema
 from src.core.services.auth.domain.interfaces import UserRepository
 from src.core.services.auth.infrastructure.services.Bcryptprovider import Bcryptprovider
+from src.core.services.cache.user_cache import user_cache
+from src.core.services.cache.token_revocations import token_revocations
 from src.core.services.database.orm.user_orm import (
     select_data_user, 
     select_data_user_id, 
@@ -47,23 +49,31 @@ class UserService(UserRepository):
     @time_checker
     async def delete_user(self, session:AsyncSession, user_id:int) -> None:
         await delete_data_user(session, user_id)
+        await user_cache.invalidate(user_id)
+        await token_revocations.revoke(user_id)
 
     @time_checker
     async def activate_user(self, session:AsyncSession, user_id: int) -> None:
         await user_activate(session, user_id, True)
+        await user_cache.invalidate(user_id)
 
     @time_checker
     async def disable_user(self, session:AsyncSession, user_id: int) -> None:
         await user_activate(session, user_id, False)
+        await user_cache.invalidate(user_id)
+        await token_revocations.revoke(user_id)
         
     @time_checker
     async def update_profile(self, session:AsyncSession, user_id:int, data:dict) -> None:
         user = await select_data_user_id(session, user_id)
         await update_profile_file(session, user, data)
+        await user_cache.invalidate(user_id)
 
     @time_checker
     async def change_password_email(self, session:AsyncSession, user:UserModel, new_pass:str, email:str) -> None:
         await update_password_by_email(session, user, new_pass, self._hash, email)
+        await user_cache.invalidate(user.id)
+        await token_revocations.revoke(user.id)
 
     @time_checker
     async def give_all_active_users_repo(self, session:AsyncSession) -> Optional[list[UserModel]]:
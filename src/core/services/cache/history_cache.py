@@ -0,0 +1,242 @@
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from collections import OrderedDict
+import asyncio
+import logging
+import json
+import uuid
+
+from redis.exceptions import WatchError
+
+from src.core.config.config import settings
+from src.core.services.cache.redis import ConnectionManager as RedisManager
+from src.core.services.database.models.chat import MessageModel, DirectModel
+from src.core.services.chat.infrastructure.services.BroadcastFrame import BroadcastFrame
+
+
+logger = logging.getLogger(__name__)
+
+
+def history_item(msg:Union[MessageModel, DirectModel]) -> Dict:
+    """Envelope of a stored message in history frames and the history cache"""
+    return {
+            "id": str(msg.id),
+            "type": "historical",
+            "sender_id": msg.user_id if isinstance(msg, MessageModel) else msg.actor_id,
+            "content": msg.message,
+            "timestamp": msg.created_at.isoformat()
+        }
+
+def history_frame(items: List[Dict]) -> BroadcastFrame:
+    """The whole history of a join as one frame, oldest first"""
+    return BroadcastFrame({'type': 'history', 'messages': items})
+
+def history_key(conversation: str) -> str:
+    """Coalescing key of history frames: a newer snapshot replaces one still queued for the socket"""
+    return f"history:{conversation}"
+
+
+class HistoryCache:
+    """
+    Recent room history shared by every worker: one capped redis list per room,
+    oldest first, holding the same items the history frames carry.
+
+    Messages are appended once they are persisted, so cached ids are real row ids
+    and keyset pagination can continue from them. Appends use RPUSHX: a list is only
+    (re)created from the database on a miss, never from a lone new message. An empty
+    room is remembered with a marker so it doesn't hit the database on every join.
+    A fill only lands if the version token is still the one read before the database
+    query: an append that ran meanwhile found no list to push to, and the rows the
+    fill holds would miss its messages until the ttl.
+    Hits and misses are counted in a redis hash shared by all workers.
+
+    Every write also replaces a version token of the room. frame() keeps the encoded
+    history frame of each room in process and reuses it while the token is unchanged,
+    so a burst of joins costs one GET each and shares the same bytes. At most frames
+    of them are kept, least recently used go first, a frame is dropped as soon as its
+    token is seen changed.
+    """
+    def __init__(
+            self,
+            redis_manager: RedisManager,
+            size: int = settings.chat.history_cache_size,
+            ttl: int = settings.chat.history_cache_ttl,
+            frames: int = settings.chat.history_frames,
+            prefix: str = settings.chat.channel_prefix
+            ):
+        self.size = size
+        self.ttl = ttl
+        self.frames = frames
+        self._redis = redis_manager
+        self._prefix = prefix
+        self.stats_key = f"{prefix}:history:stats"
+        self._frames: OrderedDict[Tuple[str, str, int], Tuple[str, BroadcastFrame]] = OrderedDict()
+        self._building: Dict[Tuple[str, str, int], asyncio.Task] = {}
+
+    def key(self, room_type: str, room_id: str) -> str:
+        return f"{self._prefix}:history:{room_type}:{room_id}"
+
+    async def get(self, room_type: str, room_id: str, limit: int) -> Optional[List[Dict]]:
+        """Newest limit items oldest first, None on a miss"""
+        items, _ = await self._read(room_type, room_id, limit)
+        return items
+
+    async def frame(
+            self,
+            room_type: str,
+            room_id: str,
+            limit: int,
+            load: Callable[[], Awaitable[List[Dict]]]
+            ) -> BroadcastFrame:
+        """
+        Encoded history frame of a room, load() reads the database on a miss.
+        Concurrent joins of a room wait for a single build.
+        """
+        room = (room_type, room_id, limit)
+        cached = self._frames.get(room)
+        if cached:
+            if cached[0] == await self._version(room_type, room_id):
+                self._frames.move_to_end(room)
+                await self._count('hits')
+                return cached[1]
+            self._frames.pop(room, None)
+
+        build = self._building.get(room)
+        if build is None:
+            # A task, so a joiner that disconnects mid-build does not cancel it for the others
+            build = asyncio.ensure_future(self._build(room_type, room_id, limit, load))
+            self._building[room] = build
+            build.add_done_callback(lambda _: self._building.pop(room, None))
+        return await asyncio.shield(build)
+
+    async def _build(
+            self,
+            room_type: str,
+            room_id: str,
+            limit: int,
+            load: Callable[[], Awaitable[List[Dict]]]
+            ) -> BroadcastFrame:
+        items, version = await self._read(room_type, room_id, limit)
+        if items is None:
+            items = await load()
+            version = await self.fill(room_type, room_id, items, version)
+
+        frame = history_frame(items)
+        if version and self.frames > 0:
+            self._frames[(room_type, room_id, limit)] = (version, frame)
+            self._frames.move_to_end((room_type, room_id, limit))
+            while len(self._frames) > self.frames:
+                self._frames.popitem(last=False)
+        return frame
+
+    async def _read(self, room_type: str, room_id: str, limit: int) -> Tuple[Optional[List[Dict]], Optional[str]]:
+        """Items and the version token they belong to, read atomically. A miss still returns the token for fill()"""
+        if limit > self.size:
+            await self._count('misses')
+            return None, await self._version(room_type, room_id)
+
+        key = self.key(room_type, room_id)
+        try:
+            async with self._redis.redis.pipeline(transaction=True) as pipe:
+                pipe.lrange(key, -limit, -1)
+                pipe.exists(f"{key}:empty")
+                pipe.get(f"{key}:version")
+                items, empty, version = await pipe.execute()
+        except Exception as e:
+            logger.error(f"History cache read failed: {e}")
+            return None, None
+
+        if items or empty:
+            await self._count('hits')
+            return [json.loads(item) for item in items], self._decode(version)
+
+        await self._count('misses')
+        return None, self._decode(version)
+
+    async def _version(self, room_type: str, room_id: str) -> Optional[str]:
+        try:
+            return self._decode(await self._redis.redis.get(f"{self.key(room_type, room_id)}:version"))
+        except Exception as e:
+            logger.error(f"History cache read failed: {e}")
+            return None
+
+    @staticmethod
+    def _decode(value: Union[bytes, str, None]) -> Optional[str]:
+        return value.decode() if isinstance(value, bytes) else value
+
+    async def fill(self, room_type: str, room_id: str, items: List[Dict], seen: Optional[str]) -> Optional[str]:
+        """
+        Stores what the database returned after a miss, returns the new version token.
+        seen is the token read before the query, None if there was none. If it changed
+        since, nothing is stored and None is returned.
+        """
+        key = self.key(room_type, room_id)
+        version = uuid.uuid4().hex
+        try:
+            async with self._redis.redis.pipeline(transaction=True) as pipe:
+                await pipe.watch(f"{key}:version")
+                if self._decode(await pipe.get(f"{key}:version")) != seen:
+                    await pipe.unwatch()
+                    return None
+                pipe.multi()
+                pipe.delete(key, f"{key}:empty")
+                if items:
+                    pipe.rpush(key, *[json.dumps(item) for item in items[-self.size:]])
+                    pipe.expire(key, self.ttl)
+                else:
+                    pipe.set(f"{key}:empty", 1, ex=self.ttl)
+                pipe.set(f"{key}:version", version, ex=self.ttl)
+                await pipe.execute()
+        except WatchError:
+            return None
+        except Exception as e:
+            logger.error(f"History cache fill failed: {e}")
+            return None
+        return version
+
+    async def append(self, room_type: str, room_id: str, items: Iterable[Dict]):
+        """Appends persisted messages to a cached room, capped at size"""
+        key = self.key(room_type, room_id)
+        encoded = [json.dumps(item) for item in items]
+        if not encoded:
+            return
+        try:
+            async with self._redis.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(f"{key}:empty")
+                pipe.rpushx(key, *encoded)
+                pipe.ltrim(key, -self.size, -1)
+                pipe.expire(key, self.ttl)
+                # Cached frames of the room are stale on every worker from here on
+                pipe.set(f"{key}:version", uuid.uuid4().hex, ex=self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"History cache append failed: {e}")
+        # Other workers drop theirs on the next version check
+        for room in [room for room in self._frames if room[:2] == (room_type, room_id)]:
+            del self._frames[room]
+
+    async def append_saved(self, rows: Iterable[MessageModel]):
+        """Hook for freshly inserted room messages, grouped so each room costs one pipeline"""
+        rooms: Dict[Tuple[str, str], List[Dict]] = {}
+        for msg in rows:
+            rooms.setdefault((msg.room_type, msg.room_id), []).append(history_item(msg))
+        for (room_type, room_id), items in rooms.items():
+            await self.append(room_type, room_id, items)
+
+    async def stats(self) -> Dict:
+        raw = await self._redis.redis.hgetall(self.stats_key)
+        counts = {(k.decode() if isinstance(k, bytes) else k): int(v) for k, v in raw.items()}
+        hits, misses = counts.get('hits', 0), counts.get('misses', 0)
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else None,
+            'size': self.size,
+            'ttl': self.ttl
+        }
+
+    async def _count(self, field: str):
+        try:
+            await self._redis.redis.hincrby(self.stats_key, field, 1)
+        except Exception as e:
+            logger.error(f"History cache stats failed: {e}")
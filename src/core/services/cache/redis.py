@@ -17,6 +17,9 @@ class ConnectionManager:
         await self.pubsub.subscribe(channel)
         return self.pubsub
 
+    async def unsubscribe(self, channel: str):
+        await self.pubsub.unsubscribe(channel)
+
     async def publish(self, channel: str, message: str):
         await self.redis.publish(channel, message)
 
@@ -0,0 +1,47 @@
+from typing import Optional, Union
+import logging
+import time
+
+from src.core.config.config import settings
+from src.core.services.cache.redis import ConnectionManager as RedisManager, manager as redis_manager
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenRevocations:
+    """
+    Per-user cut-off for access tokens trusted on their claims alone.
+
+    Logout, deactivation and password change store the current time under the user id,
+    access tokens issued at or before it are refused. A key lives as long as an access
+    token does, by then every token it could refuse has expired anyway.
+    """
+    def __init__(self, redis_manager: RedisManager, ttl: int = settings.jwt.ACCESS_TOKEN_EXPIRE_MINUTES * 60):
+        self._redis = redis_manager
+        self.ttl = ttl
+
+    @staticmethod
+    def key(user_id: int) -> str:
+        return f"auth:revoked:{user_id}"
+
+    async def revoke(self, user_id: int):
+        try:
+            # A little longer than a token lives, clocks of workers drift
+            await self._redis.redis.set(self.key(user_id), repr(time.time()), ex=self.ttl + 60)
+        except Exception as e:
+            logger.error(f"Token revocation for user {user_id} failed: {e}")
+
+    async def is_revoked(self, user_id: int, issued_at: Union[int, float, None]) -> Optional[bool]:
+        """One GET. None when redis can not answer, the caller falls back to the database"""
+        try:
+            cutoff = await self._redis.redis.get(self.key(user_id))
+        except Exception as e:
+            logger.error(f"Token revocation check failed: {e}")
+            return None
+        if cutoff is None:
+            return False
+        return issued_at is None or float(issued_at) <= float(cutoff)
+
+
+token_revocations = TokenRevocations(redis_manager)
@@ -0,0 +1,76 @@
+from typing import Dict, Iterable, List
+import logging
+
+from src.core.config.config import settings
+from src.core.services.cache.redis import ConnectionManager as RedisManager
+
+
+logger = logging.getLogger(__name__)
+
+ROOM = 'room'
+DIRECT = 'direct'
+
+
+def room_conversation(room_type: str, room_id: str) -> str:
+    return f"{ROOM}:{room_type}/{room_id}"
+
+def direct_conversation(conversation_id: str) -> str:
+    return f"{DIRECT}:{conversation_id}"
+
+
+class UnreadCounters:
+    """
+    Unread badges without COUNT queries.
+
+    One hash holds a message counter per conversation, bumped once per published
+    message. Every user has a hash with the counter value of each conversation at
+    the time they last read it. Unread is the difference: a publish is one HINCRBY
+    no matter how many members a room has, a read is one HSET, a page with any number
+    of badges is two HMGETs.
+
+    Rooms the user never opened get no badge, direct conversations count from their
+    first message.
+    """
+    def __init__(self, redis_manager: RedisManager, prefix: str = settings.chat.channel_prefix):
+        self._redis = redis_manager
+        self.seq_key = f"{prefix}:unread:seq"
+        self._prefix = prefix
+
+    def read_key(self, user_id: str) -> str:
+        return f"{self._prefix}:unread:read:{user_id}"
+
+    async def published(self, conversation: str):
+        try:
+            await self._redis.redis.hincrby(self.seq_key, conversation, 1)
+        except Exception as e:
+            logger.error(f"Unread counter update failed: {e}")
+
+    async def read(self, user_id: str, conversation: str):
+        """Resets the badge, a message published between the two commands counts as read"""
+        try:
+            seq = await self._redis.redis.hget(self.seq_key, conversation)
+            await self._redis.redis.hset(self.read_key(user_id), conversation, int(seq or 0))
+        except Exception as e:
+            logger.error(f"Unread reset failed: {e}")
+
+    async def counts(self, user_id: str, conversations: Iterable[str]) -> Dict[str, int]:
+        conversations: List[str] = list(conversations)
+        if not conversations:
+            return {}
+        try:
+            async with self._redis.redis.pipeline(transaction=False) as pipe:
+                pipe.hmget(self.seq_key, conversations)
+                pipe.hmget(self.read_key(user_id), conversations)
+                seqs, reads = await pipe.execute()
+        except Exception as e:
+            logger.error(f"Unread read failed: {e}")
+            return {}
+
+        counts = {}
+        for conversation, seq, read in zip(conversations, seqs, reads):
+            if read is None and conversation.startswith(f"{ROOM}:"):
+                continue
+            unread = int(seq or 0) - int(read or 0)
+            if unread > 0:
+                counts[conversation] = unread
+        return counts
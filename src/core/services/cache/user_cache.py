@@ -0,0 +1,182 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+import asyncio
+import logging
+import json
+import time
+import uuid
+
+from src.core.config.config import settings
+from src.core.services.cache.redis import ConnectionManager as RedisManager, manager as redis_manager
+from src.core.services.database.orm.user_orm import select_user_snapshot
+
+
+logger = logging.getLogger(__name__)
+
+INVALIDATE_CHANNEL = 'users:invalidate'
+
+
+@dataclass(frozen=True, slots=True)
+class UserSnapshot:
+    """What auth checks read about a user, without the password hash or the qrcode image"""
+    id: int
+    login: str
+    is_active: bool
+    otp_enabled: bool
+    photo: Optional[str]
+
+    @property
+    def photo_url(self):
+        return f"/media/{self.photo}"
+
+    @classmethod
+    def from_claims(cls, claims: Dict) -> 'UserSnapshot':
+        """From an access token, see JWTService.principal_claims. The photo is not a claim"""
+        return cls(
+            id=int(claims['sub']),
+            login=claims.get('login'),
+            is_active=bool(claims['active']),
+            otp_enabled=bool(claims.get('mfa')),
+            photo=None
+        )
+
+
+class UserCache:
+    """
+    Per-worker LRU of user snapshots, so the auth middleware does not query the
+    database on every request.
+
+    Entries expire after ttl seconds. Every change to a cached field calls invalidate,
+    which drops the entry here and publishes the id to the other workers. A load that
+    raced with an invalidation is not stored. If the subscription breaks, the whole
+    cache is dropped, until it is back ttl is the only bound on staleness.
+    """
+    def __init__(
+            self,
+            redis_manager: RedisManager,
+            size: int = settings.redis.user_cache_size,
+            ttl: float = settings.redis.user_cache_ttl
+            ):
+        self.worker_id = uuid.uuid4().hex
+        self.size = size
+        self.ttl = ttl
+        self._redis = redis_manager
+        self._users: OrderedDict[int, Tuple[float, UserSnapshot]] = OrderedDict()
+        # Bumped by every invalidation, a load started before it must not be stored
+        self._generation = 0
+        self._listener: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+
+    async def start(self):
+        if self.size > 0:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        self._users.clear()
+
+    def get(self, user_id: int) -> Optional[UserSnapshot]:
+        entry = self._users.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            self._users.pop(user_id, None)
+            self.misses += 1
+            return None
+        self._users.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, user: UserSnapshot):
+        if self.size <= 0:
+            return
+        self._users[user.id] = (time.monotonic() + self.ttl, user)
+        self._users.move_to_end(user.id)
+        while len(self._users) > self.size:
+            self._users.popitem(last=False)
+
+    async def load(self, session: AsyncSession, user_id: int) -> Optional[UserSnapshot]:
+        """Cached snapshot or one narrow select, None for an unknown user"""
+        user = self.get(user_id)
+        if user is not None:
+            return user
+
+        generation = self._generation
+        row = await select_user_snapshot(session, user_id)
+        if row is None:
+            return None
+        user = UserSnapshot(
+            id=row.id,
+            login=row.login,
+            is_active=bool(row.is_active),
+            otp_enabled=bool(row.otp_enabled),
+            photo=row.photo
+        )
+        if generation == self._generation:
+            self.put(user)
+        return user
+
+    async def invalidate(self, user_id: int):
+        """Call after the change is committed"""
+        self._drop(int(user_id))
+        try:
+            await self._redis.publish(INVALIDATE_CHANNEL, json.dumps({'user_id': int(user_id), 'origin': self.worker_id}))
+        except Exception as e:
+            logger.error(f"User cache invalidation publish failed: {e}")
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else None,
+            'users': len(self._users),
+            'size': self.size,
+            'ttl': self.ttl
+        }
+
+    def _drop(self, user_id: int):
+        self._generation += 1
+        self._users.pop(user_id, None)
+
+    async def _listen(self):
+        # A pubsub of its own, the shared one belongs to the chat backplane
+        pubsub = self._redis.redis.pubsub()
+        while True:
+            try:
+                if not pubsub.subscribed:
+                    await pubsub.subscribe(INVALIDATE_CHANNEL)
+                    # Whatever was published while unsubscribed is lost
+                    self._generation += 1
+                    self._users.clear()
+
+                raw = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if raw is None or raw.get('type') != 'message':
+                    continue
+
+                envelope = json.loads(raw['data'])
+                if envelope.get('origin') != self.worker_id:
+                    self._drop(int(envelope['user_id']))
+
+            except asyncio.CancelledError:
+                await pubsub.aclose()
+                raise
+            except Exception as e:
+                logger.error(f"User cache listener error: {e}")
+                self._generation += 1
+                self._users.clear()
+                try:
+                    await pubsub.reset()
+                except Exception:
+                    pass
+                await asyncio.sleep(1.0)
+
+
+user_cache = UserCache(redis_manager)
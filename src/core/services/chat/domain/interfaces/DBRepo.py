@@ -1,8 +1,10 @@
 from abc import ABC, abstractmethod
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 
 from src.core.services.chat.infrastructure.services.RoomService import RoomService
 from src.core.services.chat.infrastructure.services.ConnectionManager import ConnectionManager
+from src.core.services.chat.infrastructure.services.ClientConnection import ClientConnection
 
 
 class DBRepo(ABC):
@@ -21,5 +23,6 @@ class DBRepo(ABC):
             room_type: str, 
             room_id: str, 
             user_id: str, 
-            limit: int = 50
+            limit: int = 50,
+            connection: Optional[ClientConnection] = None
             ): ...
\ No newline at end of file
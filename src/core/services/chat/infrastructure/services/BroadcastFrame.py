@@ -0,0 +1,118 @@
+from typing import Any, Dict, Optional
+import logging
+import json
+import zlib
+
+import msgpack
+
+
+logger = logging.getLogger(__name__)
+
+TEXT = 'text'
+DEFLATE = 'deflate'
+MSGPACK = 'msgpack'
+
+# Subprotocol a client offers to receive precompressed binary frames
+DEFLATE_SUBPROTOCOL = 'chat.deflate'
+# Subprotocol for MessagePack in both directions, same envelopes as json
+MSGPACK_SUBPROTOCOL = 'chat.msgpack'
+
+SUBPROTOCOLS = {
+    DEFLATE_SUBPROTOCOL: DEFLATE,
+    MSGPACK_SUBPROTOCOL: MSGPACK
+}
+
+# Offered by clients that read {"type": "batch", "messages": [...]} frames of batching rooms.
+# A capability, not an encoding: it is picked only when no encoding subprotocol is offered
+BATCH_SUBPROTOCOL = 'chat.batch'
+
+
+class BroadcastFrame:
+    """
+    One outgoing message shared by every recipient of a broadcast.
+
+    The payload is serialised to JSON once, encoded to bytes once and, for
+    connections that negotiated chat.deflate, compressed once. Connections on
+    chat.msgpack get the payload packed once as MessagePack. The ready ASGI
+    send message is cached per encoding, so per recipient the writer only
+    hands an existing dict to the server.
+    """
+    __slots__ = ('payload', '_text', '_data', '_deflated', '_packed', '_asgi')
+
+    def __init__(self, payload: Optional[Dict[str, Any]] = None, text: Optional[str] = None):
+        if payload is None and text is None:
+            raise ValueError("Frame needs a payload or text")
+        self.payload = payload
+        self._text = text
+        self._data: Optional[bytes] = None
+        self._deflated: Optional[bytes] = None
+        self._packed: Optional[bytes] = None
+        self._asgi: Dict[str, dict] = {}
+
+    @classmethod
+    def from_text(cls, text: str) -> "BroadcastFrame":
+        return cls(text=text)
+
+    def decoded(self) -> Dict[str, Any]:
+        """Payload as a dict, parsed once for frames built from text"""
+        if self.payload is None:
+            self.payload = json.loads(self._text)
+        return self.payload
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = json.dumps(self.payload)
+        return self._text
+
+    @property
+    def data(self) -> bytes:
+        if self._data is None:
+            self._data = self.text.encode('utf-8')
+        return self._data
+
+    @property
+    def deflated(self) -> bytes:
+        """Complete raw deflate stream, readable with DecompressionStream('deflate-raw')"""
+        if self._deflated is None:
+            compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+            self._deflated = compressor.compress(self.data) + compressor.flush()
+        return self._deflated
+
+    @property
+    def packed(self) -> bytes:
+        if self._packed is None:
+            self._packed = msgpack.packb(self.decoded(), use_bin_type=True)
+        return self._packed
+
+    def asgi_message(self, encoding: str = TEXT) -> dict:
+        message = self._asgi.get(encoding)
+        if message is None:
+            if encoding == DEFLATE:
+                message = {'type': 'websocket.send', 'bytes': self.deflated}
+            elif encoding == MSGPACK:
+                message = {'type': 'websocket.send', 'bytes': self.packed}
+            else:
+                message = {'type': 'websocket.send', 'text': self.text}
+            self._asgi[encoding] = message
+        return message
+
+
+def decode_inbound(message: dict, encoding: str = TEXT) -> Dict[str, Any]:
+    """
+    Decodes a websocket.receive message. Binary frames are MessagePack on chat.msgpack,
+    text frames are always json. Raises ValueError for anything that is not an object.
+    """
+    try:
+        if message.get('bytes') is not None:
+            if encoding != MSGPACK:
+                raise ValueError("Binary frames need the chat.msgpack subprotocol")
+            data = msgpack.unpackb(message['bytes'], raw=False)
+        else:
+            data = json.loads(message.get('text') or '')
+    except (msgpack.UnpackException, TypeError) as e:
+        raise ValueError(str(e)) from e
+
+    if not isinstance(data, dict):
+        raise ValueError("Message must be an object")
+    return data
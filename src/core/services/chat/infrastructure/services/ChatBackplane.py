@@ -0,0 +1,104 @@
+from typing import Awaitable, Callable, Dict, Optional, Set
+import asyncio
+import logging
+import json
+import uuid
+
+from src.core.config.config import settings
+from src.core.services.cache.redis import ConnectionManager as RedisManager
+
+
+logger = logging.getLogger(__name__)
+
+BackplaneHandler = Callable[[Dict], Awaitable[None]]
+
+
+class ChatBackplane:
+    """
+    Cross-worker fan-out over redis pub/sub.
+
+    Every message is published once to a per-room (or per-user for directs) channel.
+    A worker is subscribed to a channel only while it has local members there,
+    so each worker receives exactly the traffic it has to deliver.
+    Envelopes published by this worker are skipped on receive - they were already
+    delivered locally before publishing.
+    """
+    def __init__(self, redis_manager: RedisManager, prefix: str = settings.chat.channel_prefix):
+        self.worker_id = uuid.uuid4().hex
+        self._redis = redis_manager
+        self._prefix = prefix
+        self._channels: Set[str] = set()
+        self._handler: Optional[BackplaneHandler] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    def room_channel(self, room_type: str, room_id: str) -> str:
+        return f"{self._prefix}:room:{room_type}:{room_id}"
+
+    def user_channel(self, user_id: str) -> str:
+        return f"{self._prefix}:user:{user_id}"
+
+    async def start(self, handler: BackplaneHandler):
+        self._handler = handler
+        self._listener = asyncio.create_task(self._listen())
+        logger.info(f"Backplane worker {self.worker_id} started")
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+        for channel in list(self._channels):
+            await self.unsubscribe(channel)
+
+    async def subscribe(self, channel: str):
+        if channel in self._channels:
+            return
+        self._channels.add(channel)
+        try:
+            await self._redis.subscribe(channel)
+        except Exception as e:
+            logger.error(f"Backplane subscribe to {channel} failed: {e}")
+
+    async def unsubscribe(self, channel: str):
+        if channel not in self._channels:
+            return
+        self._channels.discard(channel)
+        try:
+            await self._redis.unsubscribe(channel)
+        except Exception as e:
+            logger.error(f"Backplane unsubscribe from {channel} failed: {e}")
+
+    async def publish(self, channel: str, envelope: Dict):
+        envelope['origin'] = self.worker_id
+        try:
+            await self._redis.publish(channel, json.dumps(envelope))
+        except Exception as e:
+            # Local members were already served, other workers just miss this one
+            logger.error(f"Backplane publish to {channel} failed: {e}")
+
+    async def _listen(self):
+        pubsub = self._redis.pubsub
+        while True:
+            try:
+                if not pubsub.subscribed:
+                    await asyncio.sleep(0.1)
+                    continue
+
+                raw = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if raw is None or raw.get('type') != 'message':
+                    continue
+
+                envelope = json.loads(raw['data'])
+                if envelope.get('origin') == self.worker_id:
+                    continue
+                await self._handler(envelope)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Backplane listener error: {e}")
+                await asyncio.sleep(1.0)
@@ -0,0 +1,191 @@
+from fastapi import WebSocket, WebSocketDisconnect
+from typing import Any, Callable, Deque, Dict, Optional, Set, Tuple
+from collections import deque
+import asyncio
+import logging
+import time
+import uuid
+
+from src.core.services.chat.infrastructure.services.BroadcastFrame import BroadcastFrame, TEXT, decode_inbound
+
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = 'drop_oldest'
+COALESCE = 'coalesce'
+DISCONNECT = 'disconnect'
+OVERFLOW_POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+
+# Control lane only carries errors, heartbeats and close notices, it never needs to be deep
+CONTROL_QUEUE_SIZE = 16
+
+# Application level heartbeat, ASGI gives no access to websocket ping frames
+PING = 'ping'
+PONG = 'pong'
+
+
+class ClientConnection:
+    """
+    One websocket with its own bounded outbound queue and writer task.
+
+    Producers only call enqueue(), which never awaits, so a sender is never coupled
+    to the recipient's TCP window. The writer drains the control lane first, then
+    regular frames, and each socket write is bounded by send_timeout.
+
+    Overflow policies when the regular queue is full:
+    drop_oldest - discard the oldest queued frame
+    coalesce - a frame with a key replaces the queued frame with the same key, otherwise drop oldest.
+               History snapshots are keyed by conversation, chat messages are never keyed
+    disconnect - close the slow consumer
+    """
+    def __init__(
+            self,
+            websocket: WebSocket,
+            user_id: str,
+            max_queue: int,
+            overflow_policy: str,
+            send_timeout: float,
+            on_close: Optional[Callable[["ClientConnection"], None]] = None,
+            encoding: str = TEXT,
+            batching: bool = False
+            ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+
+        self.id = uuid.uuid4().hex
+        self.websocket = websocket
+        self.user_id = user_id
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.send_timeout = send_timeout
+        self.encoding = encoding
+        # Offered chat.batch, gets a batching room's window as one frame
+        self.batching = batching
+        self.closed = False
+        self.dropped = 0
+        self.last_seen = time.monotonic()
+
+        # Routing tags of this socket: rooms it joined and conversation ids of directs it shows
+        self.rooms: Set[Tuple[str, str]] = set()
+        self.conversations: Set[str] = set()
+
+        # (coalesce key, frame)
+        self._queue: Deque[Tuple[Optional[str], BroadcastFrame]] = deque()
+        self._control: Deque[BroadcastFrame] = deque(maxlen=CONTROL_QUEUE_SIZE)
+        self._close_code: Optional[int] = None
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self._on_close = on_close
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def stop(self):
+        self.closed = True
+        if self._writer and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+        self._writer = None
+
+    def enqueue(self, message: BroadcastFrame, key: Optional[str] = None) -> bool:
+        if self.closed or self._close_code is not None:
+            return False
+
+        if key is not None and self.overflow_policy == COALESCE:
+            for index, (queued_key, _) in enumerate(self._queue):
+                if queued_key == key:
+                    self._queue[index] = (key, message)
+                    return True
+
+        if len(self._queue) >= self.max_queue:
+            if self.overflow_policy == DISCONNECT:
+                logger.warning(f"Outbound queue of {self.user_id} is full, disconnecting slow consumer")
+                self.close(code=1008, notice=BroadcastFrame({'type': 'error', 'content': 'Connection too slow, disconnected'}))
+                return False
+
+            self._queue.popleft()
+            self.dropped += 1
+
+        self._queue.append((key, message))
+        self._wakeup.set()
+        return True
+
+    def enqueue_control(self, message: BroadcastFrame) -> bool:
+        if self.closed:
+            return False
+        self._control.append(message)
+        self._wakeup.set()
+        return True
+
+    def close(self, code: int = 1000, notice: Optional[BroadcastFrame] = None):
+        """Queued close: the notice goes out on the control lane, pending regular frames are dropped"""
+        if self.closed or self._close_code is not None:
+            return
+        if notice:
+            self._control.append(notice)
+        self._queue.clear()
+        self._close_code = code
+        self._wakeup.set()
+
+    async def receive(self) -> Dict[str, Any]:
+        """
+        Next inbound message in the negotiated protocol, ValueError if it can't be decoded.
+        Every frame refreshes last_seen, heartbeat answers are consumed here.
+        """
+        while True:
+            message = await self.websocket.receive()
+            self.last_seen = time.monotonic()
+            if message['type'] == 'websocket.disconnect':
+                raise WebSocketDisconnect(message.get('code', 1000), message.get('reason'))
+
+            data = decode_inbound(message, self.encoding)
+            if data.get('type') != PONG:
+                return data
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue) + len(self._control)
+
+    async def _write_loop(self):
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+
+                while self._control or self._queue:
+                    if self._control:
+                        message = self._control.popleft()
+                    else:
+                        _, message = self._queue.popleft()
+
+                    await asyncio.wait_for(
+                        self.websocket.send(message.asgi_message(self.encoding)),
+                        timeout=self.send_timeout
+                    )
+
+                if self._close_code is not None:
+                    await self._shutdown(self._close_code)
+                    return
+
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"Send to {self.user_id} missed {self.send_timeout}s deadline, evicting")
+            await self._shutdown(1011)
+        except Exception as e:
+            logger.error(f"Error sending to {self.user_id}: {str(e)}")
+            await self._shutdown(1011)
+
+    async def _shutdown(self, code: int):
+        self.closed = True
+        self._queue.clear()
+        self._control.clear()
+        if self._on_close:
+            self._on_close(self)
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), timeout=self.send_timeout)
+        except Exception:
+            pass
@@ -1,77 +1,346 @@
 from fastapi import WebSocket
-from typing import Dict, Set, Optional, DefaultDict
+from typing import Dict, Set, Optional, DefaultDict, Iterable, Union, List
 from collections import defaultdict
+import asyncio
 import logging
 
+from src.core.config.config import settings
+from src.core.schemas.message_shema import conversation_key
 from src.core.services.chat.infrastructure.services.RoomService import RoomService
+from src.core.services.chat.infrastructure.services.ChatBackplane import ChatBackplane
+from src.core.services.chat.infrastructure.services.ShardRouter import ShardRouter
+from src.core.services.chat.infrastructure.services.ClientConnection import ClientConnection
+from src.core.services.chat.infrastructure.services.RoomBatcher import RoomBatcher
+from src.core.services.chat.infrastructure.services.BroadcastFrame import (
+    BroadcastFrame,
+    TEXT,
+    DEFLATE_SUBPROTOCOL,
+    BATCH_SUBPROTOCOL,
+    SUBPROTOCOLS
+)
 
 logger = logging.getLogger(__name__)
 
 class ConnectionManager:
-    def __init__(self):
-        # user_id: WebSocket
-        self.active_connections: Dict[str, WebSocket] = {}
+    def __init__(
+            self,
+            backplane: Optional[ChatBackplane] = None,
+            shard_router: Optional[ShardRouter] = None,
+            send_timeout: float = settings.chat.send_timeout,
+            max_queue: int = settings.chat.outbound_queue_size,
+            overflow_policy: str = settings.chat.overflow_policy,
+            compression: bool = settings.chat.compression
+            ):
+        # user_id: {ClientConnection}, one per tab / device
+        self.active_connections: Dict[str, Set[ClientConnection]] = {}
+        self.backplane = backplane
+        self.shard_router = shard_router
+        self.send_timeout = send_timeout
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.compression = compression
+        self.batcher = RoomBatcher()
 
+    async def start(self, room_serv:RoomService):
+        if self.backplane:
+            async def handler(envelope: dict):
+                await self._on_backplane_message(envelope, room_serv)
+            await self.backplane.start(handler)
+
+    async def stop(self):
+        self.batcher.flush_all()
+        if self.backplane:
+            await self.backplane.stop()
+
+    def get_user_connections(self, user_id: str) -> Set[ClientConnection]:
+        return self.active_connections.get(user_id, set())
+
+    async def connect(self, websocket: WebSocket, user_id: str) -> ClientConnection:
+        subprotocol = self._negotiate_subprotocol(websocket)
+        encoding = SUBPROTOCOLS.get(subprotocol, TEXT)
+        await websocket.accept(subprotocol=subprotocol)
+        connection = ClientConnection(
+            websocket,
+            user_id,
+            max_queue=self.max_queue,
+            overflow_policy=self.overflow_policy,
+            send_timeout=self.send_timeout,
+            on_close=self._drop,
+            encoding=encoding,
+            batching=BATCH_SUBPROTOCOL in websocket.scope.get('subprotocols', [])
+        )
+        connection.start()
+
+        user_connections = self.active_connections.setdefault(user_id, set())
+        user_connections.add(connection)
+        if self.backplane and len(user_connections) == 1:
+            await self.backplane.subscribe(self.backplane.user_channel(user_id))
+        return connection
+
+    async def disconnect(self, user_id: str, room_serv:RoomService, connection: Optional[ClientConnection] = None):
+        """
+        Without a connection every socket of the user is closed.
+        With one, only that socket goes away and the user stays in the rooms
+        their other sockets are still in.
+        """
+        if connection is None:
+            connections = list(self.get_user_connections(user_id))
+        else:
+            connections = [connection]
+
+        for conn in connections:
+            self._drop(conn)
+            await conn.stop()
+            for room_type, room_id in list(conn.rooms):
+                await self.leave_room(user_id, room_type, room_id, room_serv, conn)
+            for key in list(conn.conversations):
+                await self.leave_direct(user_id, key, room_serv, conn)
 
-    async def connect(self, websocket: WebSocket, user_id: str):
         if user_id not in self.active_connections:
-            await websocket.accept()
-            self.active_connections[user_id] = websocket
-
-    async def disconnect(self, user_id: str, room_serv:RoomService):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-        # Clean up room memberships
-        for room_type in room_serv.rooms:
-            for room_id in room_serv.rooms[room_type]:
-                if user_id in room_serv.rooms[room_type][room_id]:
-                    if room_serv.rooms[room_type][room_id]['clients']:
-                        room_serv.rooms[room_type][room_id]['clients'].discard(user_id)
-
-    async def join_room(self, user_id: str, room_type: str, room_id: str, room_serv:RoomService):
-        if user_id not in room_serv.rooms[room_type][room_id]['clients']:
-            room_serv.rooms[room_type][room_id]['clients'].add(user_id)
-            logger.info(f"User {user_id} joined {room_type}/{room_id}. Current members: {room_serv.rooms[room_type][room_id]}")
-
-    async def leave_room(self, user_id: str, room_type: str, room_id: str, room_serv:RoomService):
-        if room_type in room_serv.rooms and room_id in room_serv.rooms[room_type]:
-            logger.debug(type(room_serv.rooms[room_type][room_id]['clients']))
-            logger.debug(type(user_id))
-            if room_serv.rooms[room_type][room_id]['clients']:
-                room_serv.rooms[room_type][room_id]['clients'].discard(user_id)
-                logger.info(f"User {user_id} left {room_type}/{room_id}")
-
-        logger.info(room_serv.rooms)
-
-    async def send_personal_message(self, message: str, user_id: str, room_service:RoomService):
-        if user_id in self.active_connections:
-            try:
-                await self.active_connections[user_id].send_text(message)
-            except Exception as e:
-                logger.error(f"Error sending message to {user_id}: {str(e)}")
-                await self.disconnect(user_id, room_service)
-
-    async def broadcast_to_room(self, message: str, room_type: str, room_id: str, room_serv:RoomService, exclude_user: Optional[str] = None):
+            if self.backplane:
+                await self.backplane.unsubscribe(self.backplane.user_channel(user_id))
+            # Clean up room memberships, only the rooms this user was in
+            for room_type, room_id in await room_serv.leave_all_rooms(user_id):
+                await self._release_room_channel(room_type, room_id, room_serv)
+
+    async def reap(self, connection: ClientConnection, room_serv:RoomService, code: int = 1001):
+        """Drops a dead socket right away, the endpoint's own cleanup later finds nothing left to do"""
+        await self.disconnect(connection.user_id, room_serv, connection)
+        try:
+            await asyncio.wait_for(connection.websocket.close(code=code), timeout=self.send_timeout)
+        except Exception:
+            pass
+
+    async def join_room(self, user_id: str, room_type: str, room_id: str, room_serv:RoomService, connection: Optional[ClientConnection] = None):
+        if connection is not None:
+            connection.rooms.add((room_type, room_id))
+
+        # Room may live only on the worker that served the page, RoomService creates it lazily
+        if await room_serv.join_room(user_id, room_type, room_id):
+            logger.info(f"User {user_id} joined {room_type}/{room_id}")
+
+            if self.backplane and len(room_serv.room_members(room_type, room_id)) == 1:
+                await self.backplane.subscribe(self.backplane.room_channel(room_type, room_id))
+
+    async def leave_room(self, user_id: str, room_type: str, room_id: str, room_serv:RoomService, connection: Optional[ClientConnection] = None):
+        if connection is not None:
+            connection.rooms.discard((room_type, room_id))
+            # Another tab of the same user is still in this room
+            if any((room_type, room_id) in conn.rooms for conn in self.get_user_connections(user_id)):
+                return
+
+        if await room_serv.leave_room(user_id, room_type, room_id):
+            logger.info(f"User {user_id} left {room_type}/{room_id}")
+            await self._release_room_channel(room_type, room_id, room_serv)
+
+    async def join_direct(self, connection: ClientConnection, peer_id: str) -> str:
+        """Marks the socket as showing the conversation with peer_id"""
+        key = conversation_key(connection.user_id, peer_id)
+        connection.conversations.add(key)
+        return key
+
+    async def leave_direct(self, user_id: str, key: str, room_serv:RoomService, connection: Optional[ClientConnection] = None):
+        if connection is not None:
+            connection.conversations.discard(key)
+            # Another tab of the same user still shows this conversation
+            if any(key in conn.conversations for conn in self.get_user_connections(user_id)):
+                return
+        await room_serv.leave_conversation(user_id, key)
+
+    async def _release_room_channel(self, room_type: str, room_id: str, room_serv:RoomService):
+        if self.backplane and not room_serv.room_members(room_type, room_id):
+            await self.backplane.unsubscribe(self.backplane.room_channel(room_type, room_id))
+
+    async def send_personal_message(
+            self,
+            message: Union[str, BroadcastFrame],
+            user_id: str,
+            room_service:RoomService,
+            connection: Optional[ClientConnection] = None,
+            key: Optional[str] = None
+            ):
+        """key marks a replaceable frame, see the coalesce overflow policy"""
+        targets = [connection] if connection is not None else self.get_user_connections(user_id)
+        self._fan_out(self._as_frame(message), targets, key)
+
+    async def send_error(self, content: str, user_id: str, connection: Optional[ClientConnection] = None):
+        """Errors skip the regular queue so they are not stuck behind a backlog"""
+        targets = [connection] if connection is not None else self.get_user_connections(user_id)
+        frame = BroadcastFrame({'type': 'error', 'content': content})
+        for conn in list(targets):
+            conn.enqueue_control(frame)
+
+    async def broadcast_to_room(
+            self,
+            message: Union[str, BroadcastFrame],
+            room_type: str,
+            room_id: str,
+            room_serv:RoomService,
+            exclude_user: Optional[str] = None,
+            exclude_connection: Optional[ClientConnection] = None,
+            exclude_connection_id: Optional[str] = None
+            ):
+        """exclude_connection_id names a socket that may live on another worker, as for messages forwarded to a shard owner"""
         logger.debug('In broadcast logic')
-        logger.debug(room_serv.rooms)
-        if room_type in room_serv.rooms and room_id in room_serv.rooms[room_type]:
-            for user_id in list(room_serv.rooms[room_type][room_id]['clients']):
-                if user_id in self.active_connections and user_id != exclude_user:
-                    try:
-                        logger.debug('Actual sending text')
-                        await self.active_connections[user_id].send_text(message)
-                    except Exception as e:
-                        logger.error(f"Error broadcasting to {user_id}: {str(e)}")
-                        await self.disconnect(user_id, room_serv)
-
-    async def broadcast_to_direct(self, message: str, actor_id: str, recipient_id: str, room_serv:RoomService, exclude_user: Optional[str] = None):
-        logger.debug(room_serv.rooms)
-        if actor_id in room_serv.directs and recipient_id == room_serv.directs[actor_id]['recipient_id']:
-            for user_id in list(room_serv.directs[actor_id]['recipient_id']):
-                if user_id in self.active_connections and user_id != exclude_user:
-                    try:
-                        logger.debug('Actual sending text')
-                        await self.active_connections[user_id].send_text(message)
-                    except Exception as e:
-                        logger.error(f"Error broadcasting to {user_id}: {str(e)}")
-                        await self.disconnect(user_id, room_serv)
\ No newline at end of file
+        message = self._as_frame(message)
+        if exclude_connection is not None:
+            exclude_connection_id = exclude_connection.id
+        await self._deliver_to_room(message, room_type, room_id, room_serv, exclude_user, exclude_connection_id)
+
+        if self.backplane:
+            await self.backplane.publish(
+                self.backplane.room_channel(room_type, room_id),
+                {
+                    'kind': 'room',
+                    'room_type': room_type,
+                    'room_id': room_id,
+                    'exclude_user': exclude_user,
+                    'exclude_connection': exclude_connection_id,
+                    'message': message.text
+                }
+            )
+
+    async def broadcast_to_direct(
+            self,
+            message: Union[str, BroadcastFrame],
+            actor_id: str,
+            recipient_id: str,
+            room_serv:RoomService,
+            exclude_user: Optional[str] = None,
+            exclude_connection: Optional[ClientConnection] = None
+            ):
+        """
+        Reaches every socket of both participants that shows this conversation,
+        routed by conversation id, so the sender's other tabs get it too
+        """
+        key = conversation_key(actor_id, recipient_id)
+        message = self._as_frame(message)
+        exclude_connection_id = exclude_connection.id if exclude_connection is not None else None
+
+        for user_id in (recipient_id, actor_id):
+            if user_id == exclude_user:
+                continue
+            await self._deliver_to_user(message, user_id, key, exclude_connection_id)
+
+            if self.backplane:
+                await self.backplane.publish(
+                    self.backplane.user_channel(user_id),
+                    {
+                        'kind': 'user',
+                        'user_id': user_id,
+                        'conversation_id': key,
+                        'exclude_connection': exclude_connection_id,
+                        'message': message.text
+                    }
+                )
+
+    async def _deliver_to_room(
+            self,
+            message: BroadcastFrame,
+            room_type: str,
+            room_id: str,
+            room_serv:RoomService,
+            exclude_user: Optional[str] = None,
+            exclude_connection_id: Optional[str] = None
+            ):
+        if room_serv.is_batching(room_type, room_id) or self.batcher.configured(room_type, room_id):
+            self.batcher.add(
+                message,
+                room_type,
+                room_id,
+                lambda: self._room_connections(room_type, room_id, room_serv),
+                exclude_user,
+                exclude_connection_id
+            )
+            return
+
+        targets = [
+            conn for conn in self._room_connections(room_type, room_id, room_serv)
+            if conn.user_id != exclude_user and conn.id != exclude_connection_id
+        ]
+        self._fan_out(message, targets)
+
+    def _room_connections(self, room_type: str, room_id: str, room_serv:RoomService) -> List[ClientConnection]:
+        """Local sockets that joined the room"""
+        room = (room_type, room_id)
+        return [
+            conn
+            for user_id in room_serv.room_members(room_type, room_id)
+            for conn in self.get_user_connections(user_id)
+            if room in conn.rooms
+        ]
+
+    async def _deliver_to_user(
+            self,
+            message: BroadcastFrame,
+            user_id: str,
+            key: str,
+            exclude_connection_id: Optional[str] = None
+            ):
+        targets = [
+            conn for conn in self.get_user_connections(user_id)
+            if key in conn.conversations and conn.id != exclude_connection_id
+        ]
+        self._fan_out(message, targets)
+
+    def _fan_out(self, message: BroadcastFrame, connections: Iterable[ClientConnection], key: Optional[str] = None):
+        """
+        Hands the same frame object to every target's outbound queue without awaiting any socket.
+        Serialisation, encoding and compression happen once on the frame, not per recipient.
+        Each connection's writer sends concurrently under its own deadline,
+        so room latency tracks the fastest clients rather than the slowest.
+        Chat messages carry no key, each of them has to arrive.
+        """
+        for connection in list(connections):
+            connection.enqueue(message, key)
+
+    def _negotiate_subprotocol(self, websocket: WebSocket) -> Optional[str]:
+        """
+        First encoding subprotocol in the client's order that we support. chat.batch
+        is only a capability, it is echoed when it is all the client offered, since
+        browsers refuse a handshake that answers none of the offered subprotocols.
+        None keeps plain json.
+        """
+        offered = websocket.scope.get('subprotocols', [])
+        for subprotocol in offered:
+            if subprotocol == DEFLATE_SUBPROTOCOL and not self.compression:
+                continue
+            if subprotocol in SUBPROTOCOLS:
+                return subprotocol
+        if BATCH_SUBPROTOCOL in offered:
+            return BATCH_SUBPROTOCOL
+        return None
+
+    @staticmethod
+    def _as_frame(message: Union[str, BroadcastFrame]) -> BroadcastFrame:
+        if isinstance(message, BroadcastFrame):
+            return message
+        return BroadcastFrame.from_text(message)
+
+    def _drop(self, connection: ClientConnection):
+        """Stop routing to the socket. Room cleanup happens in disconnect, called by the endpoint"""
+        user_connections = self.active_connections.get(connection.user_id)
+        if user_connections is None:
+            return
+        user_connections.discard(connection)
+        if not user_connections:
+            del self.active_connections[connection.user_id]
+
+    async def _on_backplane_message(self, envelope: dict, room_serv:RoomService):
+        """Deliver a message published by another worker to local sockets only"""
+        if envelope.get('kind') == 'room':
+            await self._deliver_to_room(
+                BroadcastFrame.from_text(envelope['message']),
+                envelope['room_type'],
+                envelope['room_id'],
+                room_serv,
+                envelope.get('exclude_user'),
+                envelope.get('exclude_connection')
+            )
+        elif envelope.get('kind') == 'user':
+            await self._deliver_to_user(
+                BroadcastFrame.from_text(envelope['message']),
+                envelope['user_id'],
+                envelope['conversation_id'],
+                envelope.get('exclude_connection')
+            )
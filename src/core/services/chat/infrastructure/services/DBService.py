@@ -1,17 +1,28 @@
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Optional, Union
 import logging
-import json
 
-from src.core.schemas.message_shema import MessageSchema, MessabeSchemaBase, DirectMessage, DirectScheme
+from src.core.schemas.message_shema import MessageSchema, MessabeSchemaBase, DirectMessage, DirectScheme, conversation_key
 from src.core.services.chat.domain.interfaces.DBRepo import DBRepo
 from src.core.services.chat.infrastructure.services.RoomService import RoomService
 from src.core.services.chat.infrastructure.services.ConnectionManager import ConnectionManager
+from src.core.services.chat.infrastructure.services.ClientConnection import ClientConnection
+from src.core.services.chat.infrastructure.services.MessageWriter import MessageWriter
+from src.core.services.chat.infrastructure.services.BroadcastFrame import BroadcastFrame
+from src.core.services.cache.history_cache import HistoryCache, history_item, history_frame, history_key
+from src.core.services.cache.unread_counters import UnreadCounters, room_conversation, direct_conversation
 from src.core.services.database.models.chat import MessageModel, DirectModel
+from src.core.services.database.chat_archive import ChatArchive
 from src.core.services.database.orm.chat_orm import(
     select_messages,
     select_messages_direct,
     save_message,
-    save_message_direct
+    save_message_direct,
+    search_messages,
+    search_messages_direct,
+    save_read_cursor,
+    save_read_cursor_newest,
+    select_read_cursor
 )
 from src.utils.time_check import time_checker
 
@@ -19,25 +30,186 @@ from src.utils.time_check import time_checker
 logger = logging.getLogger(__name__)
 
 class DBService(DBRepo):
+    def __init__(
+            self,
+            writer: Optional[MessageWriter] = None,
+            history_cache: Optional[HistoryCache] = None,
+            archive: Optional[ChatArchive] = None,
+            unread: Optional[UnreadCounters] = None
+            ):
+        # With a writer messages are persisted write-behind in batches, without it one commit per message
+        self._writer = writer
+        # The writer feeds the cache itself, this service fills it on misses and after single commits
+        self._history_cache = history_cache
+        # Older pages continue in cold storage once the database runs out of rows
+        self._archive = archive
+        self._unread = unread
+
     @time_checker
     async def save_message_db(self, session:AsyncSession, message:str, room_type:str, room_id:str, sender_id:str):
         message_data = MessageSchema(user=sender_id, room_type=room_type, room_id=room_id, message=message)
-        await save_message(session, message_data)
+        if self._writer:
+            await self._writer.save(message_data)
+        else:
+            msg = await save_message(session, message_data)
+            if self._history_cache:
+                await self._history_cache.append_saved([msg])
+        # Every message is saved exactly once in the cluster, which makes this the place to count it
+        if self._unread:
+            await self._unread.published(room_conversation(room_type, room_id))
 
     @time_checker
     async def save_message_db_direct(self, session:AsyncSession, message:str, actor_id:str, recipient_id:str):
         message_data = DirectScheme(actor_id=actor_id, recipient_id=recipient_id, message=message)
-        await save_message_direct(session, message_data)
+        if self._writer:
+            await self._writer.save(message_data)
+        else:
+            await save_message_direct(session, message_data)
+        if self._unread:
+            await self._unread.published(direct_conversation(message_data.conversation_id))
+
+    async def mark_read(self, session:AsyncSession, user_id:str, conversation:str, last_read_id:Optional[int] = None):
+        """Resets the unread badge, moves the read cursor when the newest read id is known"""
+        if self._unread:
+            await self._unread.read(user_id, conversation)
+        if last_read_id is not None:
+            await save_read_cursor(session, int(user_id), conversation, last_read_id)
+
+    async def close_room_read(self, session:AsyncSession, user_id:str, room_type:str, room_id:str):
+        """
+        When a room socket closes: it was shown the history and everything after it live,
+        so the cursor goes to the newest stored message. The only cursor write of a visit
+        """
+        conversation = room_conversation(room_type, room_id)
+        if self._unread:
+            await self._unread.read(user_id, conversation)
+        await save_read_cursor_newest(session, int(user_id), conversation, room_type=room_type, room_id=room_id)
+
+    async def close_direct_read(self, session:AsyncSession, actor_id:str, recipient_id:str):
+        """close_room_read for a direct conversation"""
+        key = conversation_key(actor_id, recipient_id)
+        if self._unread:
+            await self._unread.read(actor_id, direct_conversation(key))
+        await save_read_cursor_newest(session, int(actor_id), direct_conversation(key), conversation_id=key)
+
+    async def read_cursor(self, session:AsyncSession, user_id:str, conversation:str) -> Optional[int]:
+        return await select_read_cursor(session, int(user_id), conversation)
+
+    async def unread_counts(self, user_id:str, conversations:list[str]) -> Dict[str, int]:
+        if self._unread is None:
+            return {}
+        return await self._unread.counts(user_id, conversations)
 
     @time_checker
-    async def receive_messages(self, session:AsyncSession, room_type:str, room_id:str, sender_id:str):
+    async def receive_messages(
+            self,
+            session:AsyncSession,
+            room_type:str,
+            room_id:str,
+            sender_id:str,
+            limit:int = 50,
+            before_id:Optional[int] = None,
+            after_id:Optional[int] = None
+            ):
         message_data = MessabeSchemaBase(user=sender_id,room_type=room_type, room_id=room_id)
-        return await select_messages(session, message_data)
+        messages = await select_messages(session, message_data, limit, before_id, after_id)
+        return await self._with_archived('messages', f"{room_type}/{room_id}", messages, limit, before_id, after_id)
     
     @time_checker
-    async def receive_messages_direct(self, session:AsyncSession, actor_id:str, recipient_id:str):
+    async def receive_messages_direct(
+            self,
+            session:AsyncSession,
+            actor_id:str,
+            recipient_id:str,
+            limit:int = 50,
+            before_id:Optional[int] = None,
+            after_id:Optional[int] = None
+            ):
         message_data = DirectMessage(actor_id=actor_id, recipient_id=recipient_id)
-        return await select_messages_direct(session, message_data)
+        messages = await select_messages_direct(session, message_data, limit, before_id, after_id)
+        return await self._with_archived('directs', message_data.conversation_id, messages, limit, before_id, after_id)
+
+    async def _with_archived(
+            self,
+            table:str,
+            key:str,
+            messages:list,
+            limit:int,
+            before_id:Optional[int],
+            after_id:Optional[int]
+            ) -> list:
+        """Tops up a short backwards page with archived rows older than what the database returned"""
+        if self._archive is None or after_id is not None or len(messages) >= limit:
+            return messages
+        oldest = messages[0].id if messages else before_id
+        # Rooms never archived, the usual short history, stop here
+        if not self._archive.holds(table, key, oldest):
+            return messages
+        older = await self._archive.read(table, key, limit - len(messages), before_id=oldest)
+        return older + messages
+
+    @staticmethod
+    def history_item(msg:Union[MessageModel, DirectModel]) -> Dict:
+        return history_item(msg)
+
+    @time_checker
+    async def search(
+            self,
+            session:AsyncSession,
+            text:str,
+            user_id:str,
+            limit:int = 20,
+            room_type:Optional[str] = None,
+            room_id:Optional[str] = None,
+            before_rank:Optional[float] = None,
+            before_id:Optional[int] = None
+            ) -> list[Dict]:
+        rows = await search_messages(
+                session,
+                text,
+                limit,
+                room_type=room_type,
+                room_id=room_id,
+                before_rank=before_rank,
+                before_id=before_id,
+                # Without a room only the rooms the user has opened
+                reader_id=int(user_id) if room_id is None else None
+            )
+        return [self.search_item(row, sender_id=row['user_id'], room_type=row['room_type'], room_id=row['room_id']) for row in rows]
+
+    @time_checker
+    async def search_direct(
+            self,
+            session:AsyncSession,
+            text:str,
+            user_id:str,
+            limit:int = 20,
+            peer_id:Optional[str] = None,
+            before_rank:Optional[float] = None,
+            before_id:Optional[int] = None
+            ) -> list[Dict]:
+        rows = await search_messages_direct(
+                session,
+                text,
+                user_id,
+                limit,
+                conversation_id=conversation_key(user_id, peer_id) if peer_id else None,
+                before_rank=before_rank,
+                before_id=before_id
+            )
+        return [self.search_item(row, sender_id=row['actor_id'], conversation_id=row['conversation_id']) for row in rows]
+
+    @staticmethod
+    def search_item(row, **where) -> Dict:
+        return {
+                "id": str(row['id']),
+                "type": "search",
+                **where,
+                "content": row['message'],
+                "headline": row['headline'],
+                "rank": row['rank'],
+                "timestamp": row['created_at'].isoformat()
+            }
     
     async def load_message_history(
             self, 
@@ -47,35 +219,35 @@ class DBService(DBRepo):
             room_type: str, 
             room_id: str, 
             user_id: str, 
-            limit: int = 50
-            ):
-        # Get from in-memory first
-        room = room_service.rooms.get(room_type, {}).get(room_id)
-        messages_room = room.get('messages')
-        logger.debug(f"{room} {messages_room}")
+            limit: int = 50,
+            connection: Optional[ClientConnection] = None
+            ) -> Optional[int]:
+        """Sends the history as one frame, returns the newest id in it"""
+        async def load() -> list[Dict]:
+            messages:list[MessageModel] = await self.receive_messages(
+                    session=session,
+                    room_id=room_id,
+                    room_type=room_type,
+                    sender_id=user_id,
+                    limit=limit
+                )
+            # The websocket keeps its session until it closes, hand the connection back to the pool now
+            await session.close()
+            return [self.history_item(msg) for msg in messages]
 
-        
-        messages:list[MessageModel] = await self.receive_messages(
-                session=session,
-                room_id=room_id,
-                room_type=room_type,
-                sender_id=user_id
+        if self._history_cache:
+            frame = await self._history_cache.frame(room_type, room_id, limit, load)
+        else:
+            frame = history_frame(await load())
+
+        await connection_manager.send_personal_message(
+                frame,
+                user_id,
+                room_service,
+                connection,
+                key=history_key(f"{room_type}/{room_id}")
             )
-            
-        for msg in messages:
-            if room_type == msg.room_type and room_id == msg.room_id:
-                message_data = {
-                        "id": str(msg.id),
-                        "type": "historical",
-                        "sender_id": msg.user_id,
-                        "content": msg.message,
-                        "timestamp": msg.created_at.isoformat()
-                    }
-                await connection_manager.send_personal_message(
-                        json.dumps(message_data),
-                        user_id,
-                        room_service
-                    )
+        return self.newest_id(frame)
                 
     async def load_message_history_direct(
             self, 
@@ -84,33 +256,29 @@ class DBService(DBRepo):
             room_service: RoomService,   
             recipient_id: str, 
             actor_id: str, 
-            limit: int = 50
-            ):
-        # Get from in-memory first
-        room = room_service.directs.get(actor_id, {})
-        messages_room = room.get('messages')
-        logger.debug(f"{room} {messages_room}")
-
-        
+            limit: int = 50,
+            connection: Optional[ClientConnection] = None
+            ) -> Optional[int]:
         messages:list[DirectModel] = await self.receive_messages_direct(
                 session=session,
                 actor_id=actor_id,
-                recipient_id=recipient_id
+                recipient_id=recipient_id,
+                limit=limit
+            )
+        await session.close()
+
+        frame = history_frame([self.history_item(msg) for msg in messages])
+        await connection_manager.send_personal_message(
+                frame,
+                actor_id,
+                room_service,
+                connection,
+                key=history_key(conversation_key(actor_id, recipient_id))
             )
-            
-        for msg in messages:
-            if recipient_id == msg.recipient_id or recipient_id == msg.actor_id:
-                message_data = {
-                        "id": str(msg.id),
-                        "type": "historical",
-                        "sender_id": msg.actor_id,
-                        "content": msg.message,
-                        "timestamp": msg.created_at.isoformat()
-                    }
-                await connection_manager.send_personal_message(
-                        json.dumps(message_data),
-                        actor_id,
-                        room_service
-                    )
-            else:
-                continue
\ No newline at end of file
+        return self.newest_id(frame)
+
+    @staticmethod
+    def newest_id(frame: BroadcastFrame) -> Optional[int]:
+        """Id of the newest message in a history frame, None for an empty history"""
+        messages = frame.decoded()['messages']
+        return int(messages[-1]['id']) if messages else None
@@ -1,14 +1,17 @@
 import json
 import logging
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
 import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.core.dependencies.db_injection import db_helper
 from src.core.services.chat.domain.interfaces.MessageRepo import MessageRepository
 from src.core.services.chat.infrastructure.services.ConnectionManager import ConnectionManager
 from src.core.services.chat.infrastructure.services.RoomService import RoomService
 from src.core.services.chat.infrastructure.services.DBService import DBService
+from src.core.services.chat.infrastructure.services.BroadcastFrame import BroadcastFrame
+from src.core.services.chat.infrastructure.services.ClientConnection import ClientConnection
 
 
 logger = logging.getLogger(__name__)
@@ -26,7 +29,65 @@ class MessageService:
             room_type: str, 
             room_id: str, 
             user_id: str,
-            user_login: str
+            user_login: str,
+            connection: Optional[ClientConnection] = None
+            ):
+        # In shard mode the room owner handles the message, it answers to the forwarded copy
+        router = self.connection_manager.shard_router
+        if router and await router.forward(room_type, room_id, {
+                'message': message_data,
+                'room_type': room_type,
+                'room_id': room_id,
+                'user_id': user_id,
+                'user_login': user_login,
+                'connection_id': connection.id if connection else None
+                }):
+            return
+
+        await self._process_room_message(
+            session,
+            DBService,
+            room_service,
+            message_data,
+            room_type,
+            room_id,
+            user_id,
+            user_login,
+            exclude_user=None if connection else user_id,
+            exclude_connection_id=connection.id if connection else None
+        )
+
+    async def process_forwarded(self, payload: Dict, room_service: RoomService, db_service: DBService):
+        """Message forwarded by another worker to this one as the room owner, never forwarded again"""
+        # The owner keeps the room's history buffer even without local members
+        if payload['room_id'] not in room_service.rooms.get(payload['room_type'], {}):
+            await room_service.create_room(payload['room_type'], payload['room_id'])
+
+        async with db_helper.async_session() as session:
+            await self._process_room_message(
+                session,
+                db_service,
+                room_service,
+                payload['message'],
+                payload['room_type'],
+                payload['room_id'],
+                payload['user_id'],
+                payload['user_login'],
+                exclude_connection_id=payload.get('connection_id')
+            )
+
+    async def _process_room_message(
+            self,
+            session:AsyncSession,
+            DBService:DBService,
+            room_service: RoomService,
+            message_data: Dict,
+            room_type: str,
+            room_id: str,
+            user_id: str,
+            user_login: str,
+            exclude_user: Optional[str] = None,
+            exclude_connection_id: Optional[str] = None
             ):
         try:
             # Create full message object
@@ -51,13 +112,14 @@ class MessageService:
             # Add to room's in-memory history
             await room_service.add_message_to_room(room_type, room_id, full_message)
             
-            # Broadcast to room
+            # Broadcast to room, the frame is encoded once for all members
             await self.connection_manager.broadcast_to_room(
-                message=json.dumps(full_message),
+                message=BroadcastFrame(full_message),
                 room_type=room_type,
                 room_id=room_id,
                 room_serv=room_service,
-                exclude_user=user_id
+                exclude_user=exclude_user,
+                exclude_connection_id=exclude_connection_id
             )
             
         except Exception as e:
@@ -73,7 +135,7 @@ class MessageService:
             actor_id:str,
             recipient_id:str,
             actor:str,
-
+            connection: Optional[ClientConnection] = None
             ):
         try:
             # Create full message object
@@ -98,11 +160,12 @@ class MessageService:
             
             # Broadcast to room
             await self.connection_manager.broadcast_to_direct(
-                message=json.dumps(full_message),
+                message=BroadcastFrame(full_message),
                 actor_id=actor_id,
                 recipient_id=recipient_id,
                 room_serv=room_service,
-                exclude_user=actor_id
+                exclude_user=None if connection else actor_id,
+                exclude_connection=connection
             )
             
         except Exception as e:
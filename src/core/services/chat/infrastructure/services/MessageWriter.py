@@ -0,0 +1,122 @@
+from typing import Awaitable, Callable, List, Optional, Union
+import asyncio
+import logging
+import time
+
+from src.core.config.config import settings
+from src.core.dependencies.db_injection import db_helper
+from src.core.schemas.message_shema import MessageSchema, DirectScheme
+from src.core.services.database.models.chat import MessageModel
+from src.core.services.database.orm.chat_orm import save_messages_bulk, save_messages_direct_bulk
+
+
+logger = logging.getLogger(__name__)
+
+PendingMessage = Union[MessageSchema, DirectScheme]
+
+# A failed batch is retried this many times before it is logged and dropped
+FLUSH_RETRIES = 2
+
+
+class MessageWriter:
+    """
+    Write-behind persistence for chat messages.
+
+    save() only puts the message in a bounded queue, the sender's loop waits on
+    the database only when the queue is full. A single flusher drains the queue
+    every batch_ms or as soon as batch_size messages are waiting, and writes each
+    batch with one multi-row INSERT and one commit per table. stop() flushes
+    everything that is still queued.
+    """
+    def __init__(
+            self,
+            batch_ms: float = settings.chat.write_batch_ms,
+            batch_size: int = settings.chat.write_batch_size,
+            max_queue: int = settings.chat.write_queue_size,
+            on_saved: Optional[Callable[[List[MessageModel]], Awaitable[None]]] = None
+            ):
+        self.batch = batch_ms / 1000
+        self.batch_size = batch_size
+        # Called with the stored room messages after every flush, e.g. to feed the history cache
+        self._on_saved = on_saved
+        self._queue: asyncio.Queue[PendingMessage] = asyncio.Queue(maxsize=max_queue)
+        self._flusher: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Future] = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def start(self):
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        if self._inflight:
+            await self._inflight
+
+        while not self._queue.empty():
+            await self._write(self._take(self.batch_size))
+        logger.info("Message writer drained")
+
+    async def save(self, message: PendingMessage):
+        await self._queue.put(message)
+
+    def _take(self, limit: int) -> List[PendingMessage]:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _flush_loop(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.batch
+
+            while len(batch) < self.batch_size:
+                batch.extend(self._take(self.batch_size - len(batch)))
+                timeout = deadline - time.monotonic()
+                if len(batch) >= self.batch_size or timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Cancelling the loop must not lose a batch already taken from the queue
+            self._inflight = asyncio.ensure_future(self._write(batch))
+            await asyncio.shield(self._inflight)
+            self._inflight = None
+
+    async def _write(self, batch: List[PendingMessage]):
+        rooms = [message for message in batch if isinstance(message, MessageSchema)]
+        directs = [message for message in batch if isinstance(message, DirectScheme)]
+        # Each table commits on its own, a retry never inserts the other one twice
+        saved = await self._write_rows(save_messages_bulk, rooms)
+        await self._write_rows(save_messages_direct_bulk, directs)
+
+        if saved and self._on_saved:
+            try:
+                await self._on_saved(saved)
+            except Exception as e:
+                logger.error(f"Post-save hook failed: {e}")
+
+    async def _write_rows(self, save: Callable[..., Awaitable[Optional[list]]], rows: List[PendingMessage]) -> Optional[list]:
+        if not rows:
+            return None
+        for attempt in range(FLUSH_RETRIES + 1):
+            try:
+                async with db_helper.async_session() as session:
+                    return await save(session, rows)
+            except Exception as e:
+                if attempt == FLUSH_RETRIES:
+                    logger.error(f"Dropping {len(rows)} messages after failed flush: {e}")
+                    return None
+                logger.warning(f"Message flush failed, retrying: {e}")
+                await asyncio.sleep(0.1 * (attempt + 1))
@@ -0,0 +1,154 @@
+from typing import Dict, Optional, Set
+import asyncio
+import logging
+import json
+import time
+import uuid
+
+from src.core.config.config import settings
+from src.core.services.cache.redis import ConnectionManager as RedisManager
+from src.core.services.chat.infrastructure.services.ConnectionManager import ConnectionManager
+from src.core.services.chat.infrastructure.services.RoomService import RoomService
+from src.core.services.chat.infrastructure.services.BroadcastFrame import BroadcastFrame
+from src.core.services.chat.infrastructure.services.ClientConnection import PING
+
+
+logger = logging.getLogger(__name__)
+
+GLOBAL = '*'
+
+
+class PresenceService:
+    """
+    Heartbeats, idle reaping and online counts.
+
+    ASGI does not expose websocket ping frames, so every ping_interval the server
+    sends {"type": "ping"} on the control lane to sockets that were quiet for that long
+    and clients answer {"type": "pong"}. Any inbound frame counts as a sign of life.
+    A socket silent for idle_timeout is reaped: it leaves its rooms at once instead of
+    costing a failed send on every broadcast until the peer's TCP finally gives up.
+
+    Each worker writes a snapshot under a key of its own with SET EX and lists the key
+    in a registry ZSET scored by the time of the write. A crashed worker's key expires
+    after ttl and its registry entry is trimmed by the next reader, so it drops out on
+    its own. A read is one pipeline: trim the registry, list it, then one MGET of the
+    listed keys, never a walk over the keyspace. Plain keys rather than hash fields
+    with HEXPIRE, which needs redis 7.4.
+
+    The snapshot holds the ids of the worker's users, the global figure is the size of
+    their union, so a user with sockets on several workers counts once. Room figures
+    are summed per worker: a user in one room from two workers counts twice there.
+    """
+    def __init__(
+            self,
+            connection_manager: ConnectionManager,
+            room_serv: RoomService,
+            redis_manager: RedisManager,
+            worker_id: Optional[str] = None,
+            ping_interval: float = settings.chat.ping_interval,
+            idle_timeout: float = settings.chat.idle_timeout,
+            ttl: int = settings.chat.presence_ttl,
+            prefix: str = settings.chat.channel_prefix
+            ):
+        self.worker_id = worker_id or uuid.uuid4().hex
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.ttl = ttl
+        self.registry = f"{prefix}:presence"
+        self.key = f"{self.registry}:{self.worker_id}"
+        self._con_manager = connection_manager
+        self._room_serv = room_serv
+        self._redis = redis_manager
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            async with self._redis.redis.pipeline(transaction=False) as pipe:
+                pipe.delete(self.key)
+                pipe.zrem(self.registry, self.key)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Presence cleanup failed: {e}")
+
+    async def online_counts(self) -> Dict[str, int]:
+        """{"room_type/room_id": users online, "*": distinct users online anywhere}, over every worker"""
+        counts: Dict[str, int] = {GLOBAL: 0}
+        try:
+            async with self._redis.redis.pipeline(transaction=False) as pipe:
+                pipe.zremrangebyscore(self.registry, '-inf', time.time() - self.ttl)
+                pipe.zrange(self.registry, 0, -1)
+                _, keys = await pipe.execute()
+            snapshots = await self._redis.redis.mget(keys) if keys else []
+        except Exception as e:
+            logger.error(f"Presence read failed: {e}")
+            return counts
+
+        users: Set[str] = set()
+        for raw in snapshots:
+            # Expired before its registry entry was trimmed
+            if raw is None:
+                continue
+            snapshot = json.loads(raw)
+            users.update(snapshot['users'])
+            for room, count in snapshot['rooms'].items():
+                counts[room] = counts.get(room, 0) + count
+        counts[GLOBAL] = len(users)
+        return counts
+
+    async def sweep(self):
+        """Pings quiet sockets, reaps dead ones and memberships left without a socket"""
+        now = time.monotonic()
+        ping = BroadcastFrame({'type': PING})
+
+        for user_id in list(self._con_manager.active_connections):
+            for conn in list(self._con_manager.get_user_connections(user_id)):
+                idle = now - conn.last_seen
+                if idle > self.idle_timeout:
+                    logger.info(f"Reaping socket of {user_id}, silent for {idle:.0f}s")
+                    await self._con_manager.reap(conn, self._room_serv)
+                elif idle >= self.ping_interval:
+                    conn.enqueue_control(ping)
+
+        # Sockets evicted by their writer are already unrouted, their rooms are cleaned here
+        for user_id in list(self._room_serv.memberships):
+            if user_id not in self._con_manager.active_connections:
+                await self._con_manager.disconnect(user_id, self._room_serv)
+
+    async def publish(self):
+        snapshot = {
+            'rooms': {
+                f"{room_type}/{room_id}": len(room['clients'])
+                for room_type, rooms in self._room_serv.rooms.items()
+                for room_id, room in rooms.items()
+                if room['clients']
+            },
+            'users': list(self._con_manager.active_connections)
+        }
+
+        async with self._redis.redis.pipeline(transaction=False) as pipe:
+            pipe.set(self.key, json.dumps(snapshot), ex=self.ttl)
+            pipe.zadd(self.registry, {self.key: time.time()})
+            # Gone with the last worker
+            pipe.expire(self.registry, self.ttl)
+            await pipe.execute()
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            try:
+                await self.sweep()
+                await self.publish()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Presence tick failed: {e}")
@@ -0,0 +1,104 @@
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import logging
+
+from src.core.config.config import settings
+from src.core.services.chat.infrastructure.services.BroadcastFrame import BroadcastFrame
+from src.core.services.chat.infrastructure.services.ClientConnection import ClientConnection
+
+
+logger = logging.getLogger(__name__)
+
+Room = Tuple[str, str]
+# Resolved at flush time, members that joined during the window get the batch too
+TargetsGetter = Callable[[], Iterable[ClientConnection]]
+# (frame, exclude_user, exclude_connection_id)
+Pending = Tuple[BroadcastFrame, Optional[str], Optional[str]]
+
+
+class RoomBatcher:
+    """
+    Time-window coalescing for rooms that opted in.
+
+    Messages of a room are held for window_ms, or until max_messages are waiting,
+    and then every member that offered chat.batch gets them as one
+    {"type": "batch", "messages": [...]} frame. Members that have to skip some of the
+    messages (their own) share a frame with the others that skip the same ones, so a
+    batch costs one encode per sender, not per member. A window holding a single
+    message goes out as the plain frame. Sockets without chat.batch get the plain
+    frames queued at once, each still encoded once for all members.
+    """
+    def __init__(
+            self,
+            window_ms: float = settings.chat.batch_window_ms,
+            max_messages: int = settings.chat.batch_max_messages,
+            rooms: Iterable[str] = settings.chat.batch_rooms
+            ):
+        self.window = window_ms / 1000
+        self.max_messages = max_messages
+        # "room_type/room_id" keys from settings, RoomService can switch rooms at runtime
+        self._configured: Set[str] = set(rooms)
+        self._buffers: Dict[Room, List[Pending]] = {}
+        self._timers: Dict[Room, asyncio.TimerHandle] = {}
+        self._targets: Dict[Room, TargetsGetter] = {}
+
+    def configured(self, room_type: str, room_id: str) -> bool:
+        return f"{room_type}/{room_id}" in self._configured
+
+    def add(
+            self,
+            frame: BroadcastFrame,
+            room_type: str,
+            room_id: str,
+            targets: TargetsGetter,
+            exclude_user: Optional[str] = None,
+            exclude_connection_id: Optional[str] = None
+            ):
+        room = (room_type, room_id)
+        self._targets[room] = targets
+        buffer = self._buffers.setdefault(room, [])
+        buffer.append((frame, exclude_user, exclude_connection_id))
+
+        if len(buffer) >= self.max_messages:
+            self.flush(room_type, room_id)
+        elif room not in self._timers:
+            self._timers[room] = asyncio.get_running_loop().call_later(self.window, self.flush, room_type, room_id)
+
+    def flush(self, room_type: str, room_id: str):
+        timer = self._timers.pop((room_type, room_id), None)
+        if timer:
+            timer.cancel()
+        targets = self._targets.pop((room_type, room_id), None)
+        buffer = self._buffers.pop((room_type, room_id), None)
+        if not buffer:
+            return
+
+        # Members grouped by the messages they must not get back
+        groups: Dict[Tuple[int, ...], List[ClientConnection]] = {}
+        for conn in targets():
+            skipped = tuple(
+                index for index, (_, exclude_user, exclude_connection_id) in enumerate(buffer)
+                if exclude_user == conn.user_id or exclude_connection_id == conn.id
+            )
+            groups.setdefault(skipped, []).append(conn)
+
+        for skipped, connections in groups.items():
+            items = [frame for index, (frame, _, _) in enumerate(buffer) if index not in skipped]
+            if not items:
+                continue
+            batch: Optional[BroadcastFrame] = None
+            for conn in connections:
+                if not conn.batching or len(items) == 1:
+                    for item in items:
+                        conn.enqueue(item)
+                    continue
+                if batch is None:
+                    batch = BroadcastFrame({
+                        'type': 'batch',
+                        'messages': [item.decoded() for item in items]
+                    })
+                conn.enqueue(batch)
+
+    def flush_all(self):
+        for room_type, room_id in list(self._buffers):
+            self.flush(room_type, room_id)
@@ -1,6 +1,7 @@
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Set, Tuple
 import logging
 
+from src.core.schemas.message_shema import conversation_key
 
 
 logger = logging.getLogger(__name__)
@@ -10,30 +11,91 @@ class RoomService:
         # Structure: {room_type: {room_id: {'name': str, 'password': str, 'messages': list, 'clients':{} }}}
         self.rooms: Dict[str, Dict[str, Dict[str, list, set]]] = {}
 
-        # Structure: {actor_id: {recipient_id:str, recipients_id: set(), 'messages':list}
-        self.directs: Dict[str, Dict[str, set]] = {}
+        # Structure: {conversation_id: {'participants': (user_id, user_id), 'members': set(), 'messages': list}}
+        self.directs: Dict[str, Dict] = {}
+
+        # Reverse index, structure: {user_id: {(room_type, room_id)}}
+        self.memberships: Dict[str, Set[Tuple[str, str]]] = {}
         
     async def create_room(self, room_type: str, name: str, password: Optional[str] = None) -> str:
         if self.rooms.get(room_type) is None:
             self.rooms[room_type] = {}
 
+        # Re-creating a live room must not drop its members, they are indexed in memberships
+        if name in self.rooms[room_type]:
+            self.rooms[room_type][name]['password'] = password
+            return name
+
         self.rooms[room_type][name] = {
                 'password': password,
                 'messages': [],
-                'clients':set()
+                'clients':set(),
+                'batching': False
             }
-        
-    async def create_direct(self, actor_id: str, recipient_id: str):
-        if self.directs.get(actor_id) is None:
-            self.directs[actor_id] = {}
+        return name
 
-        self.directs[actor_id] = {
-                'recipient_id':recipient_id,
-                'messages': [],
-                'recipients_id':set()
-            }
-        if recipient_id not in self.directs[actor_id]['recipients_id']:
-            self.directs[actor_id]['recipients_id'].add(recipient_id)
+    async def join_room(self, user_id: str, room_type: str, room_id: str) -> bool:
+        """Returns True if the user was not a member yet"""
+        if room_id not in self.rooms.get(room_type, {}):
+            await self.create_room(room_type, room_id)
+
+        clients = self.rooms[room_type][room_id]['clients']
+        if user_id in clients:
+            return False
+
+        clients.add(user_id)
+        self.memberships.setdefault(user_id, set()).add((room_type, room_id))
+        return True
+
+    async def leave_room(self, user_id: str, room_type: str, room_id: str) -> bool:
+        """Returns True if the user was a member"""
+        room = self.rooms.get(room_type, {}).get(room_id)
+        if room is None or user_id not in room['clients']:
+            return False
+
+        room['clients'].discard(user_id)
+        user_rooms = self.memberships.get(user_id)
+        if user_rooms is not None:
+            user_rooms.discard((room_type, room_id))
+            if not user_rooms:
+                del self.memberships[user_id]
+        return True
+
+    async def leave_all_rooms(self, user_id: str) -> List[Tuple[str, str]]:
+        """O(memberships of the user) instead of a walk over every room"""
+        user_rooms = self.memberships.pop(user_id, set())
+        for room_type, room_id in user_rooms:
+            room = self.rooms.get(room_type, {}).get(room_id)
+            if room is not None:
+                room['clients'].discard(user_id)
+        return list(user_rooms)
+
+    async def set_batching(self, room_type: str, room_id: str, enabled: bool = True):
+        """Opt a hot room into time-window coalescing of its broadcasts"""
+        if room_id not in self.rooms.get(room_type, {}):
+            await self.create_room(room_type, room_id)
+        self.rooms[room_type][room_id]['batching'] = enabled
+
+    def is_batching(self, room_type: str, room_id: str) -> bool:
+        room = self.rooms.get(room_type, {}).get(room_id)
+        return bool(room and room.get('batching'))
+
+    def room_members(self, room_type: str, room_id: str) -> Set[str]:
+        room = self.rooms.get(room_type, {}).get(room_id)
+        return room['clients'] if room else set()
+        
+    async def create_direct(self, actor_id: str, recipient_id: str) -> str:
+        """Opens the conversation for actor_id, both sides share one entry keyed by conversation id"""
+        key = conversation_key(actor_id, recipient_id)
+        direct = self.directs.get(key)
+        if direct is None:
+            direct = self.directs[key] = {
+                    'participants': tuple(sorted((str(actor_id), str(recipient_id)))),
+                    'members': set(),
+                    'messages': []
+                }
+        direct['members'].add(actor_id)
+        return key
     
     async def add_message_to_room(self, room_type: str, room_name: str, message: Dict):
         if room_type in self.rooms and room_name in self.rooms[room_type]:
@@ -61,16 +123,32 @@ class RoomService:
         if not exact_room:
             return False
             
-        if room_type == 'private' and room['password'] and room['password'] != password:
+        if exact_room.get('password') and exact_room['password'] != password:
             return False
             
         return True
+
+    async def can_read(self, user_id: str, room_type: str, room_name: str, password: Optional[str] = None) -> bool:
+        """
+        For HTTP reads of a room: members of the room and holders of its password.
+        Rooms this worker doesn't know are open unless private, those live only where they were created.
+        """
+        room = self.rooms.get(room_type, {}).get(room_name)
+        if room is None:
+            return room_type != 'private'
+        if user_id in room['clients']:
+            return True
+        return await self.validate_room_access(room_type, room_name, password)
     
     async def leave_direct(self, actor_id: str, recipient_id: str):
-        logger.debug(self.directs)
-        if recipient_id in self.directs[actor_id]:
-            if self.directs[actor_id]['recipients_id']:
-                self.directs[actor_id]['recipients_id'].discard(recipient_id)
-                logger.info(f"User {actor_id} left {recipient_id}")
+        await self.leave_conversation(actor_id, conversation_key(actor_id, recipient_id))
+
+    async def leave_conversation(self, actor_id: str, key: str):
+        direct = self.directs.get(key)
+        if direct is None:
+            return
 
-        logger.info(self.rooms)
\ No newline at end of file
+        direct['members'].discard(actor_id)
+        logger.info(f"User {actor_id} left {key}")
+        if not direct['members']:
+            del self.directs[key]
\ No newline at end of file
@@ -0,0 +1,66 @@
+from typing import Dict, Iterable, List, Optional
+import bisect
+import hashlib
+
+
+def room_key(room_type: str, room_id: str) -> str:
+    return f"{room_type}/{room_id}"
+
+
+class ShardRing:
+    """
+    Consistent hash ring over worker ids.
+
+    Every worker is placed on the ring vnodes times, a key belongs to the first
+    point clockwise from its hash. Adding a worker only takes keys from its
+    neighbours, removing one only hands its keys to the next points, every
+    other key keeps its owner.
+    """
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 64):
+        if vnodes < 1:
+            raise ValueError("vnodes must be positive")
+        self.vnodes = vnodes
+        self._points: List[int] = []
+        self._owners: Dict[int, str] = {}
+        self._nodes = set()
+        for node in nodes:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+    @property
+    def nodes(self) -> List[str]:
+        return sorted(self._nodes)
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, node: str) -> bool:
+        return node in self._nodes
+
+    def add_node(self, node: str):
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for replica in range(self.vnodes):
+            point = self._hash(f"{node}#{replica}")
+            # md5 collisions between vnodes are practically impossible, first one wins
+            if point in self._owners:
+                continue
+            self._owners[point] = node
+            bisect.insort(self._points, point)
+
+    def remove_node(self, node: str):
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        self._points = [point for point in self._points if self._owners[point] != node]
+        self._owners = {point: self._owners[point] for point in self._points}
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[self._points[index]]
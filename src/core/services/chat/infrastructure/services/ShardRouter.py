@@ -0,0 +1,183 @@
+from typing import Awaitable, Callable, Dict, Optional
+from pathlib import Path
+import asyncio
+import logging
+import json
+import socket
+import time
+
+from src.core.config.config import settings
+from src.core.services.cache.redis import ConnectionManager as RedisManager
+from src.core.services.chat.infrastructure.services.ShardRing import ShardRing, room_key
+
+
+logger = logging.getLogger(__name__)
+
+ForwardHandler = Callable[[Dict], Awaitable[None]]
+
+# A worker that missed this many heartbeats is taken off the ring
+MISSED_HEARTBEATS = 3
+
+
+class ShardRouter:
+    """
+    Room ownership across worker processes.
+
+    Workers announce themselves in a redis hash with a heartbeat and build the same
+    consistent hash ring from it. The owner of a room persists, keeps the history
+    buffer and fans out its messages; other workers forward inbound messages to the
+    owner over its unix socket as newline delimited json. Delivery to sockets held by
+    other workers still goes through the backplane.
+
+    Unix sockets only reach workers of the same host, so the registry is per host:
+    with several hosts on one redis every host has a ring of its own workers and a room
+    has one owner per host.
+    """
+    def __init__(
+            self,
+            redis_manager: RedisManager,
+            worker_id: str,
+            socket_dir: str = settings.chat.shard_socket_dir,
+            vnodes: int = settings.chat.shard_vnodes,
+            heartbeat: float = settings.chat.shard_heartbeat,
+            prefix: str = settings.chat.channel_prefix,
+            host: str = settings.chat.shard_host
+            ):
+        self.worker_id = worker_id
+        self.ring = ShardRing(vnodes=vnodes)
+        self.socket_path = str(Path(socket_dir) / f"{worker_id}.sock")
+        self._redis = redis_manager
+        self._socket_dir = socket_dir
+        self._heartbeat = heartbeat
+        self.host = host or socket.gethostname()
+        self._registry = f"{prefix}:shards:{self.host}"
+        self._paths: Dict[str, str] = {}
+        self._peers: Dict[str, asyncio.StreamWriter] = {}
+        self._handler: Optional[ForwardHandler] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._beat: Optional[asyncio.Task] = None
+
+    async def start(self, handler: ForwardHandler):
+        self._handler = handler
+        Path(self._socket_dir).mkdir(parents=True, exist_ok=True)
+        Path(self.socket_path).unlink(missing_ok=True)
+        self._server = await asyncio.start_unix_server(self._serve_peer, path=self.socket_path)
+
+        await self._announce()
+        self._beat = asyncio.create_task(self._heartbeat_loop())
+        logger.info(f"Shard worker {self.worker_id} listening on {self.socket_path}")
+
+    async def stop(self):
+        if self._beat:
+            self._beat.cancel()
+            try:
+                await self._beat
+            except asyncio.CancelledError:
+                pass
+            self._beat = None
+
+        # Leave the ring right away instead of waiting for the others to time us out
+        try:
+            await self._redis.redis.hdel(self._registry, self.worker_id)
+        except Exception as e:
+            logger.error(f"Shard deregistration failed: {e}")
+
+        for writer in self._peers.values():
+            writer.close()
+        self._peers.clear()
+
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        Path(self.socket_path).unlink(missing_ok=True)
+
+    def owner(self, room_type: str, room_id: str) -> Optional[str]:
+        return self.ring.owner(room_key(room_type, room_id))
+
+    def is_owner(self, room_type: str, room_id: str) -> bool:
+        owner = self.owner(room_type, room_id)
+        return owner is None or owner == self.worker_id
+
+    async def forward(self, room_type: str, room_id: str, payload: Dict) -> bool:
+        """
+        Sends the message to the room owner. Returns False when this worker owns
+        the room or the owner can't be reached - the caller then handles it locally.
+        """
+        owner = self.owner(room_type, room_id)
+        if owner is None or owner == self.worker_id:
+            return False
+
+        try:
+            writer = await self._peer(owner)
+            writer.write(json.dumps(payload).encode('utf-8') + b'\n')
+            await writer.drain()
+            return True
+        except Exception as e:
+            logger.warning(f"Forward to shard {owner} failed, handling locally: {e}")
+            self._forget_peer(owner)
+            return False
+
+    async def _peer(self, worker_id: str) -> asyncio.StreamWriter:
+        writer = self._peers.get(worker_id)
+        if writer is None or writer.is_closing():
+            _, writer = await asyncio.open_unix_connection(self._paths[worker_id])
+            self._peers[worker_id] = writer
+        return writer
+
+    def _forget_peer(self, worker_id: str):
+        writer = self._peers.pop(worker_id, None)
+        if writer:
+            writer.close()
+
+    async def _serve_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                try:
+                    await self._handler(json.loads(line))
+                except Exception as e:
+                    logger.error(f"Forwarded message failed: {e}")
+        finally:
+            writer.close()
+
+    async def _announce(self):
+        await self._redis.redis.hset(
+            self._registry,
+            self.worker_id,
+            json.dumps({'path': self.socket_path, 'seen': time.time()})
+        )
+        await self._refresh()
+
+    async def _refresh(self):
+        """Rebuilds the ring from the registry, dropping workers that stopped beating"""
+        deadline = time.time() - self._heartbeat * MISSED_HEARTBEATS
+        alive: Dict[str, str] = {}
+        for worker_id, raw in (await self._redis.redis.hgetall(self._registry)).items():
+            worker_id = worker_id.decode() if isinstance(worker_id, bytes) else worker_id
+            entry = json.loads(raw)
+            if entry['seen'] < deadline:
+                await self._redis.redis.hdel(self._registry, worker_id)
+                continue
+            alive[worker_id] = entry['path']
+
+        joined = alive.keys() - set(self.ring.nodes)
+        left = set(self.ring.nodes) - alive.keys()
+        for worker_id in joined:
+            self.ring.add_node(worker_id)
+        for worker_id in left:
+            self.ring.remove_node(worker_id)
+            self._forget_peer(worker_id)
+        self._paths = alive
+
+        if joined or left:
+            logger.info(f"Shard ring rebalanced: +{sorted(joined)} -{sorted(left)}, {len(self.ring)} workers")
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self._heartbeat)
+            try:
+                await self._announce()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Shard heartbeat failed: {e}")
@@ -0,0 +1,161 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+import asyncio
+import logging
+import gzip
+import json
+import os
+
+from src.core.config.config import settings
+from src.core.services.database.models.chat import MessageModel, DirectModel
+from src.core.services.database.orm.partition_orm import partition_rows
+
+
+logger = logging.getLogger(__name__)
+
+MODELS = {'messages': MessageModel, 'directs': DirectModel}
+INDEX_FILE = 'index.json'
+# Computed by postgres from other columns, not worth storing
+DERIVED_COLUMNS = ('search_vector',)
+
+def row_key(table:str, row:Dict) -> str:
+    """What history is looked up by: the room for messages, the conversation for directs"""
+    if table == 'messages':
+        return f"{row['room_type']}/{row['room_id']}"
+    return row['conversation_id']
+
+
+class ChatArchive:
+    """
+    Cold storage for history that left the database.
+
+    A month of a table is written as gzipped JSON-lines segments of up to chunk_rows
+    rows in id order, under <root>/<table>/<YYYY_MM>/. index.json lists every segment
+    with its id range and the rooms or conversations it holds, so a read opens only
+    the segments of the room it pages through. Archiving a month again replaces its
+    segments, a run that died half way is simply repeated. The oldest archived id of
+    every room is kept in memory with the index, holds() answers from it, so history
+    of rooms that were never archived costs no archive I/O.
+    """
+    def __init__(self, root: Path = settings.archive_root, chunk_rows: int = settings.chat.archive_chunk_rows):
+        self.root = Path(root)
+        self.chunk_rows = chunk_rows
+        self._index: Dict[str, Dict[str, List[Dict]]] = {}
+        self._index_mtime: Optional[float] = None
+        # {table: {room or conversation: oldest archived id}}
+        self._oldest: Dict[str, Dict[str, int]] = {}
+
+    async def archive_partition(self, session: AsyncSession, table: str, name: str, month: date) -> int:
+        """Streams a partition into segments and records them in the index, returns the rows written"""
+        segments, after_id = [], 0
+        while True:
+            rows = await partition_rows(session, name, after_id, self.chunk_rows)
+            # No transaction stays open over the whole partition
+            await session.commit()
+            if not rows:
+                break
+            segments.append(await asyncio.to_thread(self._write_segment, table, month, rows))
+            after_id = rows[-1]['id']
+
+        await asyncio.to_thread(self._record, table, month, segments)
+        total = sum(segment['rows'] for segment in segments)
+        logger.info(f"Archived {total} rows of {name} in {len(segments)} segments")
+        return total
+
+    def holds(self, table: str, key: str, before_id: Optional[int] = None) -> bool:
+        """Whether any archived row of the room or conversation is below before_id. One stat, the index is cached"""
+        self._load_index()
+        oldest = self._oldest.get(table, {}).get(key)
+        return oldest is not None and (before_id is None or oldest < before_id)
+
+    async def read(
+            self,
+            table: str,
+            key: str,
+            limit: int,
+            before_id: Optional[int] = None
+            ) -> List[Union[MessageModel, DirectModel]]:
+        """Newest limit archived rows of a room or conversation below before_id, oldest first"""
+        index = await asyncio.to_thread(self._load_index)
+        segments = sorted(
+            (
+                segment for months in index.get(table, {}).values() for segment in months
+                if key in segment['keys'] and (before_id is None or segment['min_id'] < before_id)
+            ),
+            key=lambda segment: segment['max_id'],
+            reverse=True
+        )
+
+        found: List[Dict] = []
+        for segment in segments:
+            rows = await asyncio.to_thread(self._read_segment, segment['file'])
+            found.extend(
+                row for row in reversed(rows)
+                if row_key(table, row) == key and (before_id is None or row['id'] < before_id)
+            )
+            if len(found) >= limit:
+                break
+
+        model = MODELS[table]
+        return [model(**self._from_json(row)) for row in reversed(found[:limit])]
+
+    def _write_segment(self, table: str, month: date, rows: List[Dict]) -> Dict:
+        directory = self.root / table / f"{month:%Y_%m}"
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{rows[0]['id']:012d}.jsonl.gz"
+
+        tmp = path.with_suffix('.tmp')
+        with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+            for row in rows:
+                stored = {column: value for column, value in row.items() if column not in DERIVED_COLUMNS}
+                f.write(json.dumps(stored, default=str) + '\n')
+        os.replace(tmp, path)
+
+        return {
+            'file': str(path.relative_to(self.root)),
+            'min_id': rows[0]['id'],
+            'max_id': rows[-1]['id'],
+            'rows': len(rows),
+            'keys': sorted({row_key(table, row) for row in rows})
+        }
+
+    def _read_segment(self, file: str) -> List[Dict]:
+        with gzip.open(self.root / file, 'rt', encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def _record(self, table: str, month: date, segments: List[Dict]):
+        index = self._load_index()
+        index.setdefault(table, {})[f"{month:%Y_%m}"] = segments
+        path = self.root / INDEX_FILE
+        tmp = path.with_suffix('.tmp')
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(json.dumps(index))
+        os.replace(tmp, path)
+
+    def _load_index(self) -> Dict[str, Dict[str, List[Dict]]]:
+        """Cached until the archiver replaces the file"""
+        path = self.root / INDEX_FILE
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            return {}
+        if mtime != self._index_mtime:
+            self._index = json.loads(path.read_text())
+            self._index_mtime = mtime
+            self._oldest = {}
+            for table, months in self._index.items():
+                oldest = self._oldest.setdefault(table, {})
+                for segment in (segment for segments in months.values() for segment in segments):
+                    for key in segment['keys']:
+                        oldest[key] = min(oldest.get(key, segment['min_id']), segment['min_id'])
+        return self._index
+
+    @staticmethod
+    def _from_json(row: Dict) -> Dict:
+        row = dict(row)
+        for column in ('created_at', 'deleted_at'):
+            if row.get(column):
+                row[column] = datetime.fromisoformat(row[column])
+        return row
@@ -20,6 +20,11 @@ created_at = Annotated[
     datetime, 
     mapped_column(server_default=func.timezone('UTC', func.now()))
 ]
+# Range partition key of the chat tables, Postgres wants it in the primary key
+partition_created_at = Annotated[
+    datetime,
+    mapped_column(primary_key=True, server_default=func.timezone('UTC', func.now()))
+]
 updated_at = Annotated[
     datetime, 
     mapped_column(
@@ -1,31 +1,64 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import ForeignKey, Integer, String
+from sqlalchemy import Computed, ForeignKey, Index, Integer, String
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from typing import Optional
 from datetime import datetime
 
-from .base import Base, int_pk, created_at
+from .base import Base, partition_created_at, updated_at
 from src.core.services.auth.domain.models.user import UserModel
 
+# 'simple' does no stemming, chat is written in more than one language
+SEARCH_CONFIG = 'simple'
+SEARCH_VECTOR = f"to_tsvector('{SEARCH_CONFIG}', message)"
+
 
 class MessageModel(Base):
     __tablename__ = 'messages'
+    # Monthly partitions, created and expired by the manage_chat_partitions task
+    __table_args__ = {'postgresql_partition_by': 'RANGE (created_at)'}
     
-    id: Mapped[int_pk]
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     room_id: Mapped[str] = mapped_column(String)
     room_type: Mapped[str] = mapped_column(String, default=None, nullable=True)
     user_id: Mapped[int] = mapped_column(Integer) #ForeignKey("users.id", ondelete='CASCADE'))
     message: Mapped[str]
-    created_at: Mapped[created_at]
+    created_at: Mapped[partition_created_at]
+    # Not maintained, read state lives in read_cursors
     is_read: Mapped[bool] = mapped_column(default=False)
 
     #user: Mapped["UserModel"] = relationship()
     deleted_at: Mapped[Optional[datetime]] = mapped_column(default=None)
+    # Filled by postgres, deferred so history reads don't carry it
+    search_vector: Mapped[str] = mapped_column(TSVECTOR, Computed(SEARCH_VECTOR, persisted=True), deferred=True)
 
 class DirectModel(Base):
     __tablename__ = 'directs'
+    __table_args__ = {'postgresql_partition_by': 'RANGE (created_at)'}
 
-    id: Mapped[int_pk]
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     actor_id: Mapped[str]
     recipient_id: Mapped[str]
+    # Sorted "user_id:user_id" pair, one key for both directions
+    conversation_id: Mapped[str] = mapped_column(String)
     message: Mapped[str]
-    created_at: Mapped[created_at]
\ No newline at end of file
+    created_at: Mapped[partition_created_at]
+    search_vector: Mapped[str] = mapped_column(TSVECTOR, Computed(SEARCH_VECTOR, persisted=True), deferred=True)
+
+
+class ReadCursorModel(Base):
+    """Newest message a user has read in a room or direct conversation"""
+    __tablename__ = 'read_cursors'
+
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # "room:<room_type>/<room_id>" or "direct:<conversation_id>", the keys of the unread counters
+    conversation: Mapped[str] = mapped_column(String, primary_key=True)
+    last_read_id: Mapped[int]
+    updated_at: Mapped[updated_at]
+
+
+# History access paths, defined on the partitioned parents and inherited by every partition
+Index('ix_messages_room_history', MessageModel.room_type, MessageModel.room_id, MessageModel.id.desc())
+Index('ix_directs_conversation_history', DirectModel.conversation_id, DirectModel.id.desc())
+# Full-text search, created by the message_search migration
+Index('ix_messages_search', MessageModel.search_vector, postgresql_using='gin')
+Index('ix_directs_search', DirectModel.search_vector, postgresql_using='gin')
@@ -5,6 +5,8 @@ import logging
 
 from src.core.services.auth.domain.models.user import UserModel
 from src.core.services.database.orm.token_crud import get_refresh_token_data
+from src.core.services.cache.user_cache import user_cache
+from src.core.services.cache.token_revocations import token_revocations
 from src.utils.time_check import time_checker
 
 logger = logging.getLogger(__name__)
@@ -33,6 +35,10 @@ async def disable_users(session: AsyncSession):
                     refresh_token.revoked = True
                     disabled_count+=1
                     await session.commit()
+                    # As User_Crud.disable_user: workers drop the cached active snapshot
+                    # and access tokens trusted on their claims stop passing
+                    await user_cache.invalidate(user.id)
+                    await token_revocations.revoke(user.id)
                     
         return disabled_count, users_count
     
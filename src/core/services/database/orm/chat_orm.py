@@ -1,47 +1,206 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import Select, select, insert, and_, or_, func, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import datetime, time, timezone
+from typing import Callable, Optional
 import logging
 
 
-from src.core.services.database.models.chat import MessageModel, DirectModel
+from src.core.config.config import settings
+from src.core.services.database.models.chat import MessageModel, DirectModel, ReadCursorModel, SEARCH_CONFIG
+from src.core.services.database.orm.partition_orm import month_start
 from src.core.schemas.message_shema import MessageSchema, MessabeSchemaBase, DirectMessage, DirectScheme
+from src.core.services.cache.unread_counters import ROOM
 from src.utils.time_check import time_checker
 
 
 logger = logging.getLogger(__name__)
 
+def _keyset_page(query, id_column, limit:int, before_id:Optional[int], after_id:Optional[int]):
+    """
+    Keyset pagination on the primary key. Without after_id it pages backwards from
+    before_id (or the newest row), with after_id forwards. Either way LIMIT is applied
+    in SQL, so a page costs the same no matter how big the table is.
+    """
+    if after_id is not None:
+        return query.where(id_column > after_id).order_by(id_column.asc()).limit(limit)
+    if before_id is not None:
+        query = query.where(id_column < before_id)
+    return query.order_by(id_column.desc()).limit(limit)
+
+def recent_since() -> datetime:
+    """Start of the previous month in UTC, the newest page rarely needs older partitions"""
+    return datetime.combine(month_start(datetime.now(timezone.utc), -1), time())
+
+def room_history_query(
+    message_data:MessabeSchemaBase,
+    limit:int = 50,
+    before_id:Optional[int] = None,
+    after_id:Optional[int] = None,
+    since:Optional[datetime] = None
+) -> Select:
+    """Served by ix_messages_room_history, since prunes partitions that ended before it"""
+    query = select(MessageModel).where(
+        and_(
+            MessageModel.room_type == message_data.room_type,
+            MessageModel.room_id == message_data.room_id
+        )
+    )
+    if since is not None:
+        query = query.where(MessageModel.created_at >= since)
+    return _keyset_page(query, MessageModel.id, limit, before_id, after_id)
+
+def direct_history_query(
+    message_data:DirectMessage,
+    limit:int = 50,
+    before_id:Optional[int] = None,
+    after_id:Optional[int] = None,
+    since:Optional[datetime] = None
+) -> Select:
+    """Served by ix_directs_conversation_history, a single range for both directions"""
+    query = select(DirectModel).where(DirectModel.conversation_id == message_data.conversation_id)
+    if since is not None:
+        query = query.where(DirectModel.created_at >= since)
+    return _keyset_page(query, DirectModel.id, limit, before_id, after_id)
+
+async def _history_page(
+    session: AsyncSession,
+    history_query:Callable[..., Select],
+    message_data,
+    limit:int,
+    before_id:Optional[int],
+    after_id:Optional[int]
+) -> list:
+    """
+    The newest page is read from the last two monthly partitions first and only
+    a room that was quiet for longer falls back to all of them.
+    """
+    if before_id is None and after_id is None:
+        query = history_query(message_data, limit, since=recent_since())
+        res = list((await session.execute(query)).scalars().all())
+        if len(res) == limit:
+            return res[::-1]
+
+    query = history_query(message_data, limit, before_id, after_id)
+    res = list((await session.execute(query)).scalars().all())
+    return res if after_id is not None else res[::-1]
+
 @time_checker
 async def select_messages(
     session: AsyncSession,
-    message_data:MessabeSchemaBase
-) -> MessageModel:
-    query = select(MessageModel).where(
-        MessageModel.room_id == message_data.room_id 
-        and 
-        MessageModel.user_id == int(message_data.user)
-        and
-        MessageModel.room_id == message_data.room_type)
-    res = (await session.execute(query)).scalars().all()[-40:]
-    return res
+    message_data:MessabeSchemaBase,
+    limit:int = 50,
+    before_id:Optional[int] = None,
+    after_id:Optional[int] = None
+) -> list[MessageModel]:
+    """One page of a room's history, oldest first"""
+    return await _history_page(session, room_history_query, message_data, limit, before_id, after_id)
 
 @time_checker
 async def select_messages_direct(
     session: AsyncSession,
-    message_data:DirectMessage
-
+    message_data:DirectMessage,
+    limit:int = 50,
+    before_id:Optional[int] = None,
+    after_id:Optional[int] = None
 ) -> list[DirectModel]:
-    query = select(DirectModel).where(
-        (DirectModel.actor_id == message_data.actor_id and DirectModel.recipient_id == message_data.recipient_id) |
-        (DirectModel.actor_id == message_data.recipient_id and DirectModel.recipient_id == message_data.actor_id)
+    """One page of a conversation in both directions, oldest first"""
+    return await _history_page(session, direct_history_query, message_data, limit, before_id, after_id)
+
+def _ranked_page(query:Select, id_column, search_vector, tsquery, limit:int, before_rank:Optional[float], before_id:Optional[int]) -> Select:
+    """
+    Ranks only the newest search_candidates matches: the planner either walks the id
+    index and stops early (common words) or reads the GIN index (rare ones), never both
+    in full. Pages are keyset on (rank, id).
+    """
+    matches = (
+        query.add_columns(func.ts_rank(search_vector, tsquery).label('rank'))
+        .where(search_vector.op('@@')(tsquery))
+        .order_by(id_column.desc())
+        .limit(settings.chat.search_candidates)
+        .subquery()
     )
-    res = (await session.execute(query)).scalars().all()[-40:]
-    return res
+    page = select(matches, func.ts_headline(SEARCH_CONFIG, matches.c.message, tsquery).label('headline'))
+    if before_rank is not None and before_id is not None:
+        page = page.where(
+            or_(
+                matches.c.rank < before_rank,
+                and_(matches.c.rank == before_rank, matches.c.id < before_id)
+            )
+        )
+    return page.order_by(matches.c.rank.desc(), matches.c.id.desc()).limit(limit)
+
+def room_search_query(
+    text:str,
+    limit:int = 20,
+    room_type:Optional[str] = None,
+    room_id:Optional[str] = None,
+    before_rank:Optional[float] = None,
+    before_id:Optional[int] = None,
+    reader_id:Optional[int] = None
+) -> Select:
+    """One room when given, otherwise the rooms reader_id has a read cursor in, or every room except private ones"""
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, text)
+    query = select(
+        MessageModel.id,
+        MessageModel.room_type,
+        MessageModel.room_id,
+        MessageModel.user_id,
+        MessageModel.message,
+        MessageModel.created_at
+    )
+    if room_id is not None:
+        query = query.where(and_(MessageModel.room_type == room_type, MessageModel.room_id == room_id))
+    elif reader_id is not None:
+        # Same key as room_conversation builds
+        conversation = func.concat(f"{ROOM}:", MessageModel.room_type, '/', MessageModel.room_id)
+        query = query.where(conversation.in_(
+            select(ReadCursorModel.conversation).where(ReadCursorModel.user_id == reader_id)
+        ))
+    else:
+        query = query.where(MessageModel.room_type.is_distinct_from('private'))
+    return _ranked_page(query, MessageModel.id, MessageModel.search_vector, tsquery, limit, before_rank, before_id)
+
+def direct_search_query(
+    text:str,
+    user_id:str,
+    limit:int = 20,
+    conversation_id:Optional[str] = None,
+    before_rank:Optional[float] = None,
+    before_id:Optional[int] = None
+) -> Select:
+    """Conversations of user_id only, one of them when conversation_id is given"""
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, text)
+    query = select(
+        DirectModel.id,
+        DirectModel.actor_id,
+        DirectModel.recipient_id,
+        DirectModel.conversation_id,
+        DirectModel.message,
+        DirectModel.created_at
+    )
+    if conversation_id is not None:
+        query = query.where(DirectModel.conversation_id == conversation_id)
+    else:
+        query = query.where(or_(DirectModel.actor_id == user_id, DirectModel.recipient_id == user_id))
+    return _ranked_page(query, DirectModel.id, DirectModel.search_vector, tsquery, limit, before_rank, before_id)
+
+@time_checker
+async def search_messages(session: AsyncSession, text:str, limit:int = 20, **scope) -> list:
+    """Ranked matches, best first"""
+    res = await session.execute(room_search_query(text, limit, **scope))
+    return list(res.mappings().all())
+
+@time_checker
+async def search_messages_direct(session: AsyncSession, text:str, user_id:str, limit:int = 20, **scope) -> list:
+    res = await session.execute(direct_search_query(text, user_id, limit, **scope))
+    return list(res.mappings().all())
 
 @time_checker
 async def save_message(
     session: AsyncSession,
     message_data:MessageSchema
-):
+) -> MessageModel:
     logger.debug('Saving message...')
     message = MessageModel(
         room_id=message_data.room_id,
@@ -53,6 +212,7 @@ async def save_message(
     await session.commit()
     await session.refresh(message)
     logger.debug('Message saved!')
+    return message
 
 @time_checker
 async def save_message_direct(
@@ -63,9 +223,121 @@ async def save_message_direct(
     msg = DirectModel(
         actor_id=message_data.actor_id,
         recipient_id=message_data.recipient_id, 
+        conversation_id=message_data.conversation_id,
         message=message_data.message, 
     )
     session.add(msg)
     await session.commit()
     await session.refresh(msg)
-    logger.debug('Message saved!')
\ No newline at end of file
+    logger.debug('Message saved!')
+
+@time_checker
+async def save_messages_bulk(
+    session: AsyncSession,
+    messages:list[MessageSchema]
+) -> list[MessageModel]:
+    """One multi-row INSERT and one commit for the whole batch, returns the stored rows"""
+    if not messages:
+        return []
+    res = await session.scalars(
+        insert(MessageModel).returning(MessageModel, sort_by_parameter_order=True),
+        [
+            {
+                'room_id': message_data.room_id,
+                'room_type': message_data.room_type,
+                'user_id': int(message_data.user),
+                'message': message_data.message
+            }
+            for message_data in messages
+        ]
+    )
+    rows = list(res.all())
+    await session.commit()
+    logger.debug(f'{len(messages)} messages saved!')
+    return rows
+
+@time_checker
+async def save_messages_direct_bulk(
+    session: AsyncSession,
+    messages:list[DirectScheme]
+):
+    if not messages:
+        return
+    await session.execute(
+        insert(DirectModel),
+        [
+            {
+                'actor_id': message_data.actor_id,
+                'recipient_id': message_data.recipient_id,
+                'conversation_id': message_data.conversation_id,
+                'message': message_data.message
+            }
+            for message_data in messages
+        ]
+    )
+    await session.commit()
+    logger.debug(f'{len(messages)} direct messages saved!')
+
+@time_checker
+async def save_read_cursor(
+    session: AsyncSession,
+    user_id:int,
+    conversation:str,
+    last_read_id:int
+):
+    """One upsert per read, the cursor only moves forward"""
+    query = pg_insert(ReadCursorModel).values(
+        user_id=user_id,
+        conversation=conversation,
+        last_read_id=last_read_id
+    )
+    await session.execute(_forward_only(query))
+    await session.commit()
+
+@time_checker
+async def save_read_cursor_newest(
+    session: AsyncSession,
+    user_id:int,
+    conversation:str,
+    room_type:Optional[str] = None,
+    room_id:Optional[str] = None,
+    conversation_id:Optional[str] = None
+):
+    """
+    Moves the cursor to the newest stored message of a room, or of a direct conversation
+    when conversation_id is given. One INSERT ... SELECT max(id), nothing for an empty one.
+    """
+    if conversation_id is not None:
+        id_column, where = DirectModel.id, DirectModel.conversation_id == conversation_id
+    else:
+        id_column, where = MessageModel.id, and_(MessageModel.room_type == room_type, MessageModel.room_id == room_id)
+    newest = (
+        select(literal(user_id), literal(conversation), func.max(id_column))
+        .where(where)
+        .having(func.max(id_column).is_not(None))
+    )
+    query = pg_insert(ReadCursorModel).from_select(['user_id', 'conversation', 'last_read_id'], newest)
+    await session.execute(_forward_only(query))
+    await session.commit()
+
+def _forward_only(query):
+    return query.on_conflict_do_update(
+        index_elements=[ReadCursorModel.user_id, ReadCursorModel.conversation],
+        set_={
+            'last_read_id': func.greatest(ReadCursorModel.last_read_id, query.excluded.last_read_id),
+            'updated_at': func.timezone('UTC', func.now())
+        }
+    )
+
+@time_checker
+async def select_read_cursor(
+    session: AsyncSession,
+    user_id:int,
+    conversation:str
+) -> Optional[int]:
+    res = await session.execute(
+        select(ReadCursorModel.last_read_id).where(
+            and_(ReadCursorModel.user_id == user_id, ReadCursorModel.conversation == conversation)
+        )
+    )
+    return res.scalar_one_or_none()
@@ -0,0 +1,121 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from datetime import date, datetime
+from typing import Optional, Union
+import logging
+import re
+
+from src.utils.time_check import time_checker
+
+
+logger = logging.getLogger(__name__)
+
+# Range partitioned by month on created_at, see the partition_chat_tables migration
+PARTITIONED_TABLES = ('messages', 'directs')
+
+def month_start(day:Union[date, datetime], shift:int = 0) -> date:
+    """First day of the month of day, moved by shift months"""
+    month = day.year * 12 + day.month - 1 + shift
+    return date(month // 12, month % 12 + 1, 1)
+
+def partition_name(table:str, month:date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+def partition_month(table:str, name:str) -> Optional[date]:
+    """Month a partition covers, None for tables that don't follow partition_name()"""
+    match = re.fullmatch(rf"{table}_p(\d{{4}})_(\d{{2}})", name)
+    return date(int(match[1]), int(match[2]), 1) if match else None
+
+@time_checker
+async def list_partitions(session: AsyncSession, table:str) -> list[str]:
+    res = await session.execute(
+        text("""
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = CAST(:table AS regclass)
+            ORDER BY c.relname
+        """),
+        {'table': table}
+    )
+    return list(res.scalars().all())
+
+@time_checker
+async def create_partitions(session: AsyncSession, table:str, today:date, months_ahead:int) -> list[str]:
+    """Partitions for the current month and months_ahead after it, returns the new ones"""
+    existing = set(await list_partitions(session, table))
+    created = []
+    for shift in range(months_ahead + 1):
+        start = month_start(today, shift)
+        name = partition_name(table, start)
+        if name in existing:
+            continue
+        await session.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+            f"FOR VALUES FROM ('{start}') TO ('{month_start(start, 1)}')"
+        ))
+        created.append(name)
+    await session.commit()
+    if created:
+        logger.info(f"Created partitions {created}")
+    return created
+
+@time_checker
+async def expire_partitions(
+    session: AsyncSession,
+    table:str,
+    today:date,
+    retention_months:int,
+    drop:bool = False
+) -> list[str]:
+    """
+    Detaches partitions that ended before the retention window, drops them when drop is set.
+    A detached partition is a plain table again, it can be archived or dropped by hand.
+    """
+    if retention_months <= 0:
+        return []
+
+    cutoff = month_start(today, -retention_months)
+    expired = []
+    for name in await list_partitions(session, table):
+        month = partition_month(table, name)
+        if month is None or month_start(month, 1) > cutoff:
+            continue
+        await session.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"'))
+        if drop:
+            await session.execute(text(f'DROP TABLE "{name}"'))
+        # One partition per transaction, the parent's lock is held only briefly
+        await session.commit()
+        expired.append(name)
+
+    if expired:
+        logger.info(f"{'Dropped' if drop else 'Detached'} partitions {expired}")
+    return expired
+
+@time_checker
+async def list_detached(session: AsyncSession, table:str) -> list[str]:
+    """Former partitions left as plain tables by expire_partitions()"""
+    res = await session.execute(
+        text("""
+            SELECT relname FROM pg_class
+            WHERE relkind = 'r' AND NOT relispartition AND relname ~ :pattern
+            ORDER BY relname
+        """),
+        {'pattern': rf"^{table}_p[0-9]{{4}}_[0-9]{{2}}$"}
+    )
+    return list(res.scalars().all())
+
+async def partition_rows(session: AsyncSession, name:str, after_id:int, limit:int) -> list[dict]:
+    """Next chunk of a partition in id order, served by its primary key"""
+    res = await session.execute(
+        text(f'SELECT * FROM "{name}" WHERE id > :after_id ORDER BY id LIMIT :limit'),
+        {'after_id': after_id, 'limit': limit}
+    )
+    return [dict(row) for row in res.mappings().all()]
+
+@time_checker
+async def drop_partition(session: AsyncSession, table:str, name:str, attached:bool = True):
+    if attached:
+        await session.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"'))
+    await session.execute(text(f'DROP TABLE "{name}"'))
+    await session.commit()
+    logger.info(f"Dropped partition {name}")
@@ -1,7 +1,8 @@
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from sqlalchemy import select, update, delete, join
+from sqlalchemy import select, update, delete, join, insert, exists, literal, false
+from datetime import datetime, timezone
 from typing import Union, Optional, Type
 import logging
 
@@ -67,6 +68,83 @@ async def new_token_insert(
         logger.error(err)
         raise err
 
+@time_checker
+async def rotate_token(
+    session: AsyncSession,
+    old_token: str,
+    token_scheme: RefreshToken
+):
+    """
+    Rotation in one statement and one commit. The old token is revoked only if it is
+    not revoked yet and the new one is inserted into its family, so of two requests
+    rotating the same token only one gets a new one. An old token the database does
+    not know starts the family of token_scheme.
+    Returns (id, user_id, family_id) of the new token, None if the old one was already rotated.
+    """
+    revoked_old = (
+        update(RefreshTokenModel)
+        .where(RefreshTokenModel.token == old_token, RefreshTokenModel.revoked.isnot(True))
+        .values(revoked=True, replaced_by_token=token_scheme.token)
+        .returning(
+            RefreshTokenModel.id,
+            RefreshTokenModel.user_id,
+            RefreshTokenModel.family_id,
+            RefreshTokenModel.device_info
+        )
+        .cte('revoked_old')
+    )
+    # Subqueries see the table as it was before the update, a revoked old token still exists here
+    parent = select(
+        revoked_old.c.id,
+        revoked_old.c.user_id,
+        revoked_old.c.family_id,
+        revoked_old.c.device_info
+    ).union_all(
+        select(
+            literal(None, RefreshTokenModel.id.type),
+            literal(token_scheme.user_id, RefreshTokenModel.user_id.type),
+            literal(token_scheme.family_id, RefreshTokenModel.family_id.type),
+            literal(token_scheme.device_info, RefreshTokenModel.device_info.type)
+        ).where(~exists().where(RefreshTokenModel.token == old_token))
+    ).subquery('parent')
+
+    query = insert(RefreshTokenModel).from_select(
+        [
+            RefreshTokenModel.token,
+            RefreshTokenModel.expires_at,
+            RefreshTokenModel.created_at,
+            RefreshTokenModel.revoked,
+            RefreshTokenModel.previous_token_id,
+            RefreshTokenModel.user_id,
+            RefreshTokenModel.family_id,
+            RefreshTokenModel.device_info
+        ],
+        select(
+            literal(token_scheme.token),
+            literal(token_scheme.expires_at, RefreshTokenModel.expires_at.type),
+            literal(datetime.now(timezone.utc), RefreshTokenModel.created_at.type),
+            false(),
+            parent.c.id,
+            parent.c.user_id,
+            parent.c.family_id,
+            parent.c.device_info
+        )
+    ).returning(RefreshTokenModel.id, RefreshTokenModel.user_id, RefreshTokenModel.family_id)
+
+    try:
+        result = await session.execute(query)
+        rotated = result.one_or_none()
+        await session.commit()
+        return rotated
+
+    except Exception as err:
+        await session.rollback()
+        logger.error(f"Error rotating token: {err}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to store token"
+        )
+
 @time_checker
 async def update_data_token(
     session: AsyncSession,
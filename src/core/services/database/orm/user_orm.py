@@ -31,6 +31,22 @@ async def select_data_user_id(
         logger.error(f"Failed to select user data: {str(err)}")
         raise err
 
+@time_checker
+async def select_user_snapshot(
+        session: AsyncSession,
+        user_id:int
+        ):
+    """Only the columns auth checks need, the password hash and the qrcode image stay in the database"""
+    query = select(
+        UserModel.id,
+        UserModel.login,
+        UserModel.is_active,
+        UserModel.otp_enabled,
+        UserModel.photo
+    ).where(UserModel.id == user_id)
+    result = await session.execute(query)
+    return result.one_or_none()
+
 @time_checker
 async def select_data_user(
     session: AsyncSession,
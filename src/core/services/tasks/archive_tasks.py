@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+import logging
+
+from src.core.config.config import settings
+from src.core.dependencies.db_injection import db_helper
+from src.core.services.tasks.taskiq_broker import broker
+from src.core.services.database.chat_archive import ChatArchive
+from src.core.services.database.orm.partition_orm import (
+    PARTITIONED_TABLES,
+    drop_partition,
+    list_detached,
+    list_partitions,
+    month_start,
+    partition_month
+)
+
+logger = logging.getLogger(__name__)
+
+
+@broker.task(
+    task_name="archive_chat_history",
+    schedule=[{
+        "cron": "0 4 * * *",  # Daily, after manage_chat_partitions
+        "task_name": "archive_chat_history",
+        "args": [],
+        "kwargs": {}
+    }]
+)
+async def archive_chat_history():
+    """
+    Moves months older than archive_after_months to the archive. A month goes out
+    as a whole: its rows are written to segment files, then the partition is dropped,
+    which deletes them without any DELETE, dead tuples or vacuum work.
+    Partitions already detached by the retention setting are archived the same way.
+    """
+    logger.info("Task started: archive_chat_history")
+    if settings.chat.archive_after_months <= 0:
+        return {'status': 200, 'message': 'Archiving is disabled', 'archived': {}}
+
+    cutoff = month_start(datetime.now(timezone.utc), -settings.chat.archive_after_months)
+    archive = ChatArchive()
+    archived = {}
+    try:
+        async with db_helper.async_session() as session:
+            for table in PARTITIONED_TABLES:
+                archived[table] = {}
+                attached = await list_partitions(session, table)
+                for name in attached + await list_detached(session, table):
+                    month = partition_month(table, name)
+                    if month is None or month_start(month, 1) > cutoff:
+                        continue
+                    archived[table][name] = await archive.archive_partition(session, table, name, month)
+                    await drop_partition(session, table, name, attached=name in attached)
+        return {'status': 200, 'message': 'History archived', 'archived': archived}
+    except Exception as e:
+        logger.error(f"Task failed: {str(e)}")
+        return {'status': 500, 'message': str(e), 'archived': archived}
@@ -0,0 +1,51 @@
+from datetime import datetime, timezone
+import logging
+
+from src.core.config.config import settings
+from src.core.dependencies.db_injection import db_helper
+from src.core.services.tasks.taskiq_broker import broker
+from src.core.services.database.orm.partition_orm import (
+    PARTITIONED_TABLES,
+    create_partitions,
+    expire_partitions
+)
+
+logger = logging.getLogger(__name__)
+
+
+@broker.task(
+    task_name="manage_chat_partitions",
+    schedule=[{
+        "cron": "0 3 * * *",  # Daily, months ahead are ready long before they are needed
+        "task_name": "manage_chat_partitions",
+        "args": [],
+        "kwargs": {}
+    }]
+)
+async def manage_chat_partitions():
+    logger.info("Task started: manage_chat_partitions")
+    # created_at is stored in UTC
+    today = datetime.now(timezone.utc).date()
+    created, expired = {}, {}
+    try:
+        async with db_helper.async_session() as session:
+            for table in PARTITIONED_TABLES:
+                created[table] = await create_partitions(
+                    session, table, today, settings.chat.partition_premake_months
+                )
+                expired[table] = await expire_partitions(
+                    session,
+                    table,
+                    today,
+                    settings.chat.partition_retention_months,
+                    settings.chat.partition_drop_expired
+                )
+        return {
+            'status': 200,
+            'message': 'Partitions are up to date',
+            'created': created,
+            'expired': expired
+        }
+    except Exception as e:
+        logger.error(f"Task failed: {str(e)}")
+        return {'status': 500, 'message': str(e)}
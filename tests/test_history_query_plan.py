@@ -0,0 +1,96 @@
+"""
+Query-plan regression test for the history queries.
+
+Needs the database from .env migrated to head, skipped when it can't be reached.
+Sequential scans are disabled for the session, so a plan without our index means
+the index is missing or no longer matches the query. The tables are partitioned,
+indexes of partitions are reported under the parent index they were created from.
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+
+def _explain_sql(query) -> str:
+    compiled = query.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True})
+    return f"EXPLAIN (FORMAT JSON) {compiled}"
+
+def _plan_values(plan: dict, field: str) -> set:
+    values = {plan[field]} if field in plan else set()
+    for child in plan.get('Plans', []):
+        values |= _plan_values(child, field)
+    return values
+
+async def _plan(query) -> tuple:
+    """Parent index names and partitions the plan reads"""
+    from src.core.dependencies.db_injection import db_helper
+
+    try:
+        async with db_helper.engine.connect() as conn:
+            await conn.execute(text("SET enable_seqscan = off"))
+            plan = (await conn.execute(text(_explain_sql(query)))).scalar()[0]['Plan']
+            indexes = set()
+            for name in _plan_values(plan, 'Index Name'):
+                root = await conn.execute(
+                    text("SELECT coalesce(pg_partition_root(CAST(:name AS regclass))::text, :name)"),
+                    {'name': name}
+                )
+                indexes.add(root.scalar())
+    finally:
+        await db_helper.dispose()
+    return indexes, _plan_values(plan, 'Relation Name')
+
+def plan(query) -> tuple:
+    try:
+        return asyncio.run(_plan(query))
+    except Exception as e:
+        pytest.skip(f"database not available: {e}")
+
+def plan_indexes(query) -> set:
+    return plan(query)[0]
+
+
+@pytest.fixture(scope='module')
+def orm():
+    try:
+        # Mapper registry needs every model imported
+        import src.core.services.auth.domain.models.refresh_token  # noqa: F401
+        from src.core.services.database.orm import chat_orm
+        from src.core.schemas.message_shema import MessabeSchemaBase, DirectMessage
+    except Exception as e:
+        pytest.skip(f"settings not available: {e}")
+    return chat_orm, MessabeSchemaBase, DirectMessage
+
+
+@pytest.mark.parametrize('page', [{}, {'before_id': 1000}, {'after_id': 10}])
+def test_room_history_uses_index(orm, page):
+    chat_orm, MessabeSchemaBase, _ = orm
+    query = chat_orm.room_history_query(
+        MessabeSchemaBase(user='1', room_type='general', room_id='main'),
+        limit=50,
+        **page
+    )
+    assert 'ix_messages_room_history' in plan_indexes(query)
+
+@pytest.mark.parametrize('page', [{}, {'before_id': 1000}])
+def test_direct_history_uses_index(orm, page):
+    chat_orm, _, DirectMessage = orm
+    query = chat_orm.direct_history_query(
+        DirectMessage(actor_id='1', recipient_id='2'),
+        limit=50,
+        **page
+    )
+    assert 'ix_directs_conversation_history' in plan_indexes(query)
+
+def test_newest_page_prunes_partitions(orm):
+    chat_orm, MessabeSchemaBase, _ = orm
+    query = chat_orm.room_history_query(
+        MessabeSchemaBase(user='1', room_type='general', room_id='main'),
+        limit=50,
+        since=chat_orm.recent_since()
+    )
+    indexes, partitions = plan(query)
+    assert 'ix_messages_room_history' in indexes
+    assert len(partitions) <= 2
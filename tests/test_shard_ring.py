@@ -0,0 +1,57 @@
+from collections import Counter
+
+from src.core.services.chat.infrastructure.services.ShardRing import ShardRing, room_key
+
+
+ROOMS = [room_key(room_type, f'room-{i}') for room_type in ('general', 'private', 'games') for i in range(3000)]
+
+
+def owners(ring: ShardRing):
+    return {key: ring.owner(key) for key in ROOMS}
+
+def test_empty_ring_has_no_owner():
+    assert ShardRing().owner(room_key('general', 'lobby')) is None
+
+def test_owner_is_stable_across_workers():
+    """Every worker builds the ring on its own, they must agree on each owner"""
+    first = ShardRing(['w1', 'w2', 'w3'])
+    second = ShardRing(['w3', 'w1', 'w2'])
+    assert owners(first) == owners(second)
+
+def test_rooms_spread_over_workers():
+    ring = ShardRing([f'w{i}' for i in range(4)], vnodes=64)
+    counts = Counter(owners(ring).values())
+    assert set(counts) == set(ring.nodes)
+    fair = len(ROOMS) / len(ring)
+    assert all(0.6 * fair < count < 1.4 * fair for count in counts.values())
+
+def test_worker_join_only_moves_rooms_to_new_worker():
+    ring = ShardRing(['w1', 'w2', 'w3'])
+    before = owners(ring)
+    ring.add_node('w4')
+    after = owners(ring)
+
+    moved = [key for key in ROOMS if before[key] != after[key]]
+    assert moved
+    assert all(after[key] == 'w4' for key in moved)
+    # Roughly the new worker's share, not a reshuffle
+    assert len(moved) < 0.4 * len(ROOMS)
+
+def test_worker_leave_only_moves_its_rooms():
+    ring = ShardRing(['w1', 'w2', 'w3', 'w4'])
+    before = owners(ring)
+    ring.remove_node('w2')
+    after = owners(ring)
+
+    for key in ROOMS:
+        if before[key] == 'w2':
+            assert after[key] in ('w1', 'w3', 'w4')
+        else:
+            assert after[key] == before[key]
+
+def test_leave_then_rejoin_restores_ownership():
+    ring = ShardRing(['w1', 'w2', 'w3'])
+    before = owners(ring)
+    ring.remove_node('w3')
+    ring.add_node('w3')
+    assert owners(ring) == before